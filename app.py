@@ -1,23 +1,42 @@
+import os
+from contextlib import nullcontext
 import streamlit as st
-import time
-from setup import engine
+from uuid import uuid4
 
+# share one inference host between front ends: NEURO_QUEST_SERVER=http://127.0.0.1:8080
+SERVER = os.environ.get("NEURO_QUEST_SERVER")
+if SERVER:
+    from src.engine.client import RemoteSession
+else:
+    from setup import sessions
 
-def chat_stream(prompt):
-    with st.spinner("Wait for it...", show_time=True):
-        response = engine.dialog(prompt)
-    for char in response.text:
-        yield char
-        time.sleep(0.02)
-    return response
+
+def chat_stream(engine, prompt):
+    return (yield from engine.dialog_stream(prompt))
+
+def turn_engine():
+    """Session engine kept from eviction until the turn is done"""
+    if SERVER:
+        return nullcontext(st.session_state.remote)
+    return sessions.use(st.session_state.session_id)
 
 def save_feedback(index):
     st.session_state.history[index]["feedback"] = st.session_state[f"feedback_{index}"]
 
 st.title(":robot_face: Neuro Quest")
 
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid4().hex
+
+if SERVER:
+    if "remote" not in st.session_state:
+        st.session_state.remote = RemoteSession(SERVER, st.session_state.session_id)
+    preambular = st.session_state.remote.preambular
+else:
+    preambular = sessions.get(st.session_state.session_id).prompt.preambular
+
 with st.expander("**Preambular**"):
-    st.write(engine.config.master_config.preambular)
+    st.write(preambular)
 
 if "history" not in st.session_state:
     st.session_state.history = []
@@ -40,8 +59,8 @@ if prompt := st.chat_input("Say something"):
     with st.chat_message("user"):
         st.write(prompt)
     st.session_state.history.append({"role": "user", "content": prompt})
-    with st.chat_message("assistant"):
-        response = st.write_stream(chat_stream(prompt))
+    with st.chat_message("assistant"), turn_engine() as engine:
+        response = st.write_stream(chat_stream(engine, prompt))
         st.feedback(
             "thumbs",
             key=f"feedback_{len(st.session_state.history)}",
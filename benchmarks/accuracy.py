@@ -0,0 +1,142 @@
+"""Accuracy and speed of an inference profile against the fp32 baseline
+
+NER entities of the baseline are taken as gold labels for entity F1,
+embeddings are compared by cosine similarity. Exits with status 1 when
+the profile falls below the thresholds.
+
+    python -m benchmarks.accuracy --quantize
+    python -m benchmarks.accuracy --dtype bf16 --threads 4 --ner models/ner --embedding models/embedding
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+
+from benchmarks.cases import ACTIONS, DND_TEST_CASES
+from benchmarks.stats import environment, rss_mb
+from benchmarks.tiny import make_tiny_models
+from src.ml.inference.embedding import EmbeddingInference
+from src.ml.inference.ner import NerEntity, NerInference
+from src.ml.inference.profile import InferenceDtype, InferenceProfile
+
+
+def texts() -> list[str]:
+    sentences = [s.strip() for case in DND_TEST_CASES for s in case["context"].split(".") if s.strip()]
+    return sentences + ACTIONS
+
+
+def entity_f1(gold: list[list[NerEntity]], predicted: list[list[NerEntity]]) -> dict:
+    """Micro-averaged precision, recall and F1 over (text, type) pairs per sentence"""
+    tp = fp = fn = 0
+    for expected, actual in zip(gold, predicted):
+        expected_set = {(e.text, e.type) for e in expected}
+        actual_set = {(e.text, e.type) for e in actual}
+        tp += len(expected_set & actual_set)
+        fp += len(actual_set - expected_set)
+        fn += len(expected_set - actual_set)
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1, "gold_entities": tp + fn}
+
+
+def cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return (a * b).sum(axis=1)
+
+
+def run(load: Callable[[], Any], call: Callable[[Any], Any], repeat: int) -> tuple[Any, dict]:
+    """Load a model, time repeated calls and keep the output of the last one"""
+    gc.collect()
+    rss = rss_mb()
+    start = time.perf_counter()
+    model = load()
+    loaded = time.perf_counter()
+    output = call(model)
+    latencies = []
+    for _ in range(repeat):
+        start_call = time.perf_counter()
+        output = call(model)
+        latencies.append(time.perf_counter() - start_call)
+    stats = {
+        "load_s": loaded - start,
+        "mean_ms": float(np.mean(latencies) * 1000),
+        "rss_delta_mb": rss_mb() - rss,
+    }
+    del model
+    return output, stats
+
+
+def compare(name: str, baseline: dict, candidate: dict) -> dict:
+    speedup = baseline["mean_ms"] / candidate["mean_ms"] if candidate["mean_ms"] else 0.0
+    print(
+        f"{name:<10} baseline {baseline['mean_ms']:>8.2f} ms, profile {candidate['mean_ms']:>8.2f} ms, "
+        f"speedup {speedup:.2f}x, RSS {baseline['rss_delta_mb']:.0f} -> {candidate['rss_delta_mb']:.0f} MB"
+    )
+    return {"baseline": baseline, "profile": candidate, "speedup": speedup}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dtype", type=InferenceDtype, default=InferenceDtype.FP32)
+    parser.add_argument("--quantize", action="store_true", help="dynamic int8 linear layers")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--ner", type=Path, default=None, help="NER model, tiny model if not set")
+    parser.add_argument("--embedding", type=Path, default=None, help="embedding model, tiny model if not set")
+    parser.add_argument("--models", type=Path, default=Path("tmp/bench_models"), help="tiny models directory")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--min-f1", type=float, default=0.95)
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="minimum mean cosine similarity")
+    parser.add_argument("--output", type=Path, default=None, help="write report as json")
+    args = parser.parse_args()
+
+    profile = InferenceProfile(dtype=args.dtype, quantize=args.quantize, threads=args.threads)
+    baseline = InferenceProfile(threads=args.threads)
+    tiny = make_tiny_models(args.models) if args.ner is None or args.embedding is None else {}
+    ner_path = args.ner or tiny["ner"]
+    embedding_path = args.embedding or tiny["embedding"]
+    batch = texts()
+
+    gold, ner_base = run(lambda: NerInference(ner_path, profile=baseline), lambda m: m.extract_batch(batch), args.repeat)
+    predicted, ner_profile = run(lambda: NerInference(ner_path, profile=profile), lambda m: m.extract_batch(batch), args.repeat)
+    f1 = entity_f1(gold, predicted)
+
+    reference, emb_base = run(lambda: EmbeddingInference(embedding_path, profile=baseline), lambda m: m.extract_batch(batch), args.repeat)
+    vectors, emb_profile = run(lambda: EmbeddingInference(embedding_path, profile=profile), lambda m: m.extract_batch(batch), args.repeat)
+    similarity = cosine(reference, vectors)
+
+    print(f"profile: {profile.model_dump(mode='json')}, {len(batch)} texts")
+    report = {
+        "environment": environment(),
+        "profile": profile.model_dump(mode="json"),
+        "texts": len(batch),
+        "ner": {**f1, **compare("ner", ner_base, ner_profile)},
+        "embedding": {
+            "cosine_mean": float(similarity.mean()),
+            "cosine_min": float(similarity.min()),
+            **compare("embedding", emb_base, emb_profile),
+        },
+    }
+    print(f"NER F1 {f1['f1']:.4f} over {f1['gold_entities']} baseline entities")
+    print(f"embedding cosine mean {similarity.mean():.5f}, min {similarity.min():.5f}")
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    failed = f1["f1"] < args.min_f1 or similarity.mean() < args.min_cosine
+    if failed:
+        print(f"FAILED: requires F1 >= {args.min_f1} and cosine >= {args.min_cosine}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Scripted player actions, shared by the benchmarks and notebooks/eval.ipynb"""
+
+DND_TEST_CASES = [
+    {
+        "context": "You sit hunched over a scarred oak table in Booster's Tavern, nursing an ale. "
+                   "**Booster 'The Barrel' Durnan** polishes mugs behind the bar, his jailhouse tattoos rippling with each movement. "
+                   "**Seraphine Duskwhisper** studies a pulsing crystal in the shadowed corner, its azure light casting dancing runes upon her elven features. "
+                   "The air hangs thick with whispers of the stolen Star of Luminis and the Syndicate's wrath.",
+        "prompt": "Lean across the bar and mutter to Booster: 'Heard the Black Hand's been sharpening their knives since the Star went missing. What trouble brews?'"
+    },
+    {
+        "context": "The cursed signet ring grows cold upon your finger as moonlight filters through the grimy window of Seraphine's tower sanctum. "
+                   "Ghostly whispers echo names of the dead - *'Alistair... Maris... Thorne...'* "
+                   "**Seraphine Duskwhisper** traces arcane symbols in the air, her silver braids shimmering like captured starlight. "
+                   "She warned the Hollow Specter has been seen coalescing near the Whispering Catacombs.",
+        "prompt": "Place your ring-hand palm-up on her obsidian scrying table: 'This damned thing whispers louder each night. Can its curse be broken before the Specter claims my soul?'"
+    },
+    {
+        "context": "You move like smoke through the Shivering Market, where stolen dreams are bartered under false moons. "
+                   "The scent of dragon's pepper and bloodsteel fills the air as shadow-dealers hawk their ill-gotten wares. "
+                   "**Gristle the Snitch** chews his nails near a stall selling bottled screams, his lazy eye darting nervously toward the Syndicate's Den entrance.",
+        "prompt": "Press a silver dagger against Gristle's ribs in the lee of a silk merchant's stall: 'Speak true, weasel. Where will the Black Hand strike next? Your life for the truth.'"
+    },
+    {
+        "context": "Ancient gears groan within the Clocktower of Old Veyne as Seraphine inscribes warding sigils with a staff of dragonbone. "
+                   "The Star of Luminis thrums in your palm, its blue light revealing phantom writings on the tower walls - "
+                   "*'Beware the Seventh Shadow'* pulses in eldritch script. Moonlight bleeds through cracked stained glass, painting the room in fractured colors.",
+        "prompt": "Hold the Star aloft where moonbeams strike it: 'Can this relic reveal what's hidden behind the seventh gear? There are whispers of a vault...'"
+    },
+    {
+        "context": "Rain lashes the cobblestones of Hollow's End as you crouch atop the Ragpicker's Roof. Below, "
+                   "three Black Hand enforcers in blood-red scarves drag a screaming informant toward the Whispering Catacombs. "
+                   "The cursed ring on your finger vibrates with dark energy, and for a moment, the shadows behind the thugs coalesce into the shape of the Hollow Specter.",
+        "prompt": "Unsheathe your moon-etched dagger: 'Time to even the odds.' Roll stealth as you drop behind the lead enforcer."
+    }
+]
+
+ACTIONS = [case["prompt"] for case in DND_TEST_CASES]
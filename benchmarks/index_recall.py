@@ -0,0 +1,80 @@
+"""Recall vs latency of ANN index types against the flat index
+
+    python -m benchmarks.index_recall --n 100000 --queries 1000 --k 5
+"""
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from src.memory.db.index import IndexConfig, IndexMetric, IndexType, make_index
+
+
+def synthetic(n: int, dimension: int, clusters: int, seed: int) -> np.ndarray:
+    """Clustered gaussian vectors, closer to sentence embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.3 * rng.normal(size=(n, dimension)).astype(np.float32)
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def run(n: int, queries: int, k: int, dimension: int, metric: IndexMetric, seed: int) -> list[dict]:
+    vectors = synthetic(n + queries, dimension, max(16, n // 500), seed)
+    data, query = vectors[:n].copy(), vectors[n:].copy()
+    if metric == IndexMetric.IP:
+        faiss.normalize_L2(data)
+        faiss.normalize_L2(query)
+
+    results = []
+    truth = None
+    for index_type in IndexType:
+        config = IndexConfig(type=index_type, metric=metric)
+        start = time.perf_counter()
+        index = make_index(config, data)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, indices = index.search(query, k) # type: ignore
+        latency = (time.perf_counter() - start) / queries
+
+        if truth is None:
+            truth = indices
+        recall = np.mean([
+            len(set(found) & set(expected)) / k for found, expected in zip(indices, truth)
+        ])
+        results.append({
+            "type": index_type.value,
+            "metric": metric.value,
+            "n": n,
+            "k": k,
+            "build_s": build,
+            "latency_ms": latency * 1000,
+            f"recall@{k}": float(recall),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--metric", type=IndexMetric, default=IndexMetric.IP)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None, help="write results as json")
+    args = parser.parse_args()
+
+    results = run(args.n, args.queries, args.k, args.dimension, args.metric, args.seed)
+    print(f"{'index':<10} | {'build, s':>9} | {'latency, ms':>11} | {f'recall@{args.k}':>9}")
+    for r in results:
+        print(f"{r['type']:<10} | {r['build_s']:>9.2f} | {r['latency_ms']:>11.3f} | {r[f'recall@{args.k}']:>9.3f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
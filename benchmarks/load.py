@@ -0,0 +1,233 @@
+"""Concurrent player load against per-session engines
+
+Simulates sessions arriving as a Poisson process, each replaying a script
+of player actions with exponential think time between turns. Turns are
+queued to a fixed pool of serving workers, so the report separates
+queueing delay from service time.
+
+    python -m benchmarks.load --sessions 20 --turns 10 --workers 2 --arrival-rate 1 --think-time 5
+    python -m benchmarks.load --trees parser/*.tree --sessions 50
+    python -m benchmarks.load --setup --sessions 4
+"""
+import argparse
+import json
+import random
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from queue import Queue
+from typing import Optional
+
+import joblib
+from treelib import Tree
+
+from benchmarks.cases import ACTIONS
+from benchmarks.stats import environment, rss_mb, summarize
+from benchmarks.tiny import tiny_config
+from src.engine.engine import EngineModels
+from src.engine.sessions import SessionManager
+
+
+@dataclass
+class Turn:
+    session: str
+    index: int
+    scheduled: float
+    started: float = 0.0
+    finished: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def queue_delay(self) -> float:
+        return self.started - self.scheduled
+
+    @property
+    def service(self) -> float:
+        return self.finished - self.started
+
+
+def tree_scripts(paths: list[Path], turns: int, rng: random.Random) -> list[list[str]]:
+    """Random root-to-leaf walks over parsed story trees, choice texts are the actions"""
+    trees: list[Tree] = [joblib.load(path) for path in paths]
+    scripts = []
+    for tree in trees:
+        for _ in range(max(1, len(tree.leaves()))):
+            node = tree.get_node(tree.root)
+            script = []
+            while node is not None and len(script) < turns:
+                children = tree.children(node.identifier)
+                if not children:
+                    break
+                node = rng.choice(children)
+                script.append(node.tag)
+            if script:
+                scripts.append(script)
+    return scripts
+
+
+class LoadTest:
+    def __init__(self, sessions: SessionManager, scripts: list[list[str]], args):
+        self.sessions = sessions
+        self.scripts = scripts
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.turns: list[Turn] = []
+        self.memory: list[dict] = []
+        self._queue: Queue[Optional[tuple[Turn, str, threading.Event]]] = Queue()
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._start = 0.0
+
+    def run(self):
+        self._start = time.perf_counter()
+        workers = [threading.Thread(target=self._serve, daemon=True) for _ in range(self.args.workers)]
+        monitor = threading.Thread(target=self._monitor, daemon=True)
+        for thread in workers + [monitor]:
+            thread.start()
+
+        players = []
+        arrival = 0.0
+        for i in range(self.args.sessions):
+            arrival += self.rng.expovariate(self.args.arrival_rate) if self.args.arrival_rate > 0 else 0.0
+            script = self.scripts[i % len(self.scripts)]
+            player = threading.Thread(target=self._play, args=(f"player-{i}", script, arrival), daemon=True)
+            player.start()
+            players.append(player)
+
+        for player in players:
+            player.join()
+        for _ in workers:
+            self._queue.put(None)
+        for worker in workers:
+            worker.join()
+        self._done.set()
+        monitor.join()
+
+    def _play(self, session_id: str, script: list[str], arrival: float):
+        rng = random.Random(f"{self.args.seed}-{session_id}")
+        scheduled = self._start + arrival
+        for index in range(self.args.turns):
+            time.sleep(max(0.0, scheduled - time.perf_counter()))
+            turn = Turn(session=session_id, index=index, scheduled=scheduled - self._start)
+            done = threading.Event()
+            self._queue.put((turn, script[index % len(script)], done))
+            done.wait()
+            with self._lock:
+                self.turns.append(turn)
+            think = rng.expovariate(1 / self.args.think_time) if self.args.think_time > 0 else 0.0
+            scheduled = self._start + turn.finished + think
+        if self.args.drop_sessions:
+            self.sessions.drop(session_id)
+
+    def _serve(self):
+        while (job := self._queue.get()) is not None:
+            turn, action, done = job
+            turn.started = time.perf_counter() - self._start
+            try:
+                with self.sessions.use(turn.session) as engine:
+                    engine.dialog(action)
+            except Exception as e:
+                turn.error = repr(e)
+            turn.finished = time.perf_counter() - self._start
+            done.set()
+
+    def _monitor(self):
+        while not self._done.wait(self.args.sample_interval):
+            self._sample()
+        self._sample()
+
+    def _sample(self):
+        with self._lock:
+            turns = len(self.turns)
+        self.memory.append({
+            "t": time.perf_counter() - self._start,
+            "rss_mb": rss_mb(),
+            "sessions": len(self.sessions),
+            "turns": turns,
+        })
+
+    def report(self) -> dict:
+        ok = [turn for turn in self.turns if turn.error is None]
+        elapsed = max((turn.finished for turn in self.turns), default=0.0)
+        first, last = self.memory[0], self.memory[-1]
+        return {
+            "turns": len(self.turns),
+            "errors": len(self.turns) - len(ok),
+            "elapsed_s": elapsed,
+            "throughput_turns_per_s": len(ok) / elapsed if elapsed else 0.0,
+            "queue_delay": summarize([turn.queue_delay for turn in ok]) if ok else {},
+            "service": summarize([turn.service for turn in ok]) if ok else {},
+            "end_to_end": summarize([turn.finished - turn.scheduled for turn in ok]) if ok else {},
+            "rss_start_mb": first["rss_mb"],
+            "rss_end_mb": last["rss_mb"],
+            "rss_peak_mb": max(sample["rss_mb"] for sample in self.memory),
+            "rss_growth_per_turn_kb": (last["rss_mb"] - first["rss_mb"]) * 1024 / len(ok) if ok else 0.0,
+            "memory_timeline": self.memory,
+            "turn_log": [{**asdict(turn), "queue_delay": turn.queue_delay, "service": turn.service} for turn in self.turns],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=10, help="turns per session")
+    parser.add_argument("--workers", type=int, default=1, help="concurrent serving workers")
+    parser.add_argument("--arrival-rate", type=float, default=1.0, help="new sessions per second, 0 starts all at once")
+    parser.add_argument("--think-time", type=float, default=2.0, help="mean seconds between a response and the next action")
+    parser.add_argument("--trees", type=Path, nargs="*", default=None, help="parsed story trees to take actions from")
+    parser.add_argument("--drop-sessions", action="store_true", help="drop session state when a player finishes")
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--models", type=Path, default=Path("tmp/bench_models"), help="tiny models directory")
+    parser.add_argument("--setup", action="store_true", help="use the real models from setup.py")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="write report as json")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    scripts = tree_scripts(args.trees, args.turns, rng) if args.trees else [
+        rng.sample(ACTIONS, len(ACTIONS)) for _ in range(args.sessions)
+    ]
+    if not scripts:
+        parser.error("no actions found")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.setup:
+            # importing setup already loads its models, reuse them instead of loading a second copy
+            from setup import config, models
+            config = config.model_copy(update={"vector_db_path": Path(tmp) / "db"})
+        else:
+            config = tiny_config(args.models, Path(tmp) / "db", args.max_new_tokens)
+            models = EngineModels(config)
+        config = config.model_copy(update={"max_sessions": max(config.max_sessions, args.sessions)})
+        sessions = SessionManager(config, models)
+
+        test = LoadTest(sessions, scripts, args)
+        test.run()
+        sessions.close()
+        sessions.models.close()
+
+    report = {
+        "environment": environment(),
+        "args": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items() if k != "trees"},
+        "trees": [str(path) for path in args.trees or []],
+        **test.report(),
+    }
+    print(f"turns: {report['turns']}, errors: {report['errors']}, throughput: {report['throughput_turns_per_s']:.2f} turns/s")
+    for name in ("queue_delay", "service", "end_to_end"):
+        r = report[name]
+        if r:
+            print(f"{name:<12} p50 {r['p50_ms']:>9.1f} ms | p95 {r['p95_ms']:>9.1f} ms | p99 {r['p99_ms']:>9.1f} ms")
+    print(f"RSS {report['rss_start_mb']:.0f} -> {report['rss_end_mb']:.0f} MB (peak {report['rss_peak_mb']:.0f} MB), "
+          f"{report['rss_growth_per_turn_kb']:.1f} KB per turn")
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Component and end-to-end benchmarks of the dialog pipeline over tiny local models
+
+    python -m benchmarks.pipeline --output results.json
+    python -m benchmarks.pipeline --only db --db-sizes 1000,100000,1000000
+    python -m benchmarks.pipeline --output head.json --compare base.json
+"""
+import argparse
+import json
+import tempfile
+import time
+from itertools import cycle
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from benchmarks.cases import ACTIONS, DND_TEST_CASES
+from benchmarks.stats import environment, measure, peak_rss_mb
+from benchmarks.tiny import tiny_config
+from src.engine.engine import Engine, EngineModels
+from src.memory.db.storage import VectorDb
+from src.ml.inference.embedding import EmbeddingInference
+from src.ml.inference.master import Message
+
+COMPONENTS = ["ner", "embedding", "db", "generation", "dialog"]
+
+
+def sentences() -> list[str]:
+    return [s.strip() for case in DND_TEST_CASES for s in case["context"].split(".") if s.strip()]
+
+
+def bench_ner(models: EngineModels, args, directory: Path) -> dict:
+    batch = sentences()
+    return {
+        "ner.extract": measure(lambda: models.ner.extract(ACTIONS[0]), args.repeat),
+        "ner.extract_batch": measure(lambda: models.ner.extract_batch(batch), args.repeat, items=len(batch)),
+    }
+
+
+def bench_embedding(models: EngineModels, args, directory: Path) -> dict:
+    ember = EmbeddingInference(models.config.embedding_model_path)
+    batch = sentences()
+    return {
+        "embedding.extract": measure(lambda: ember.extract(ACTIONS[0]), args.repeat),
+        "embedding.extract_batch": measure(lambda: ember.extract_batch(batch), args.repeat, items=len(batch)),
+    }
+
+
+def bench_db(models: EngineModels, args, directory: Path) -> dict:
+    rng = np.random.default_rng(0)
+    results = {}
+    for size in args.db_sizes:
+        db = VectorDb(models.ember, directory / f"db_{size}", models.config.index)
+        vectors = rng.normal(size=(size, db.dimension)).astype(np.float32)
+        start = time.perf_counter()
+        db.add_many([f"item {i}" for i in range(size)], [{} for _ in range(size)], vectors)
+        seconds = time.perf_counter() - start
+        results[f"db.add[{size}]"] = {
+            "items": size,
+            "seconds": seconds,
+            "throughput": size / seconds,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        results[f"db.search[{size}]"] = measure(lambda: db.search(ACTIONS[0], 5), args.repeat)
+        results[f"db.search_many[{size}]"] = measure(
+            lambda: db.search_many(ACTIONS, 5), args.repeat, items=len(ACTIONS)
+        )
+        del db, vectors
+    return results
+
+
+def bench_generation(models: EngineModels, args, directory: Path) -> dict:
+    messages = cycle([Message(context=case["context"], statement=case["prompt"]) for case in DND_TEST_CASES])
+    tokens = []
+
+    def generate():
+        response = models.master.generate(next(messages))
+        tokens.append(models.master.count_tokens(response.text))
+
+    result = measure(generate, args.repeat)
+    result["tokens_per_s"] = float(np.mean(tokens) / (result["mean_ms"] / 1000)) if tokens else 0.0
+    return {"master.generate": result}
+
+
+def bench_dialog(models: EngineModels, args, directory: Path) -> dict:
+    engine = Engine(models.config.model_copy(update={"vector_db_path": directory / "dialog"}), models=models)
+    actions = cycle(ACTIONS)
+    result = measure(lambda: engine.dialog(next(actions)), args.turns)
+    result["memory_items"] = len(engine.db)
+    engine.close()
+    return {"engine.dialog": result}
+
+
+BENCHMARKS = {
+    "ner": bench_ner,
+    "embedding": bench_embedding,
+    "db": bench_db,
+    "generation": bench_generation,
+    "dialog": bench_dialog,
+}
+
+
+def compare(old: dict, new: dict):
+    print(f"{'benchmark':<32} | {'p50 old, ms':>11} | {'p50 new, ms':>11} | {'delta':>8}")
+    for name, result in new["results"].items():
+        base = old["results"].get(name)
+        if base is None or "p50_ms" not in result or "p50_ms" not in base:
+            continue
+        delta = (result["p50_ms"] - base["p50_ms"]) / base["p50_ms"] * 100 if base["p50_ms"] else 0.0
+        print(f"{name:<32} | {base['p50_ms']:>11.3f} | {result['p50_ms']:>11.3f} | {delta:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", type=lambda x: x.split(","), default=COMPONENTS, help=f"comma separated subset of {COMPONENTS}")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--db-sizes", type=lambda x: [int(v) for v in x.split(",")], default=[1000, 100_000, 1_000_000])
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--models", type=Path, default=Path("tmp/bench_models"), help="tiny models directory")
+    parser.add_argument("--output", type=Path, default=None, help="write results as json")
+    parser.add_argument("--compare", type=Path, default=None, help="previous results to compare with")
+    args = parser.parse_args()
+    if unknown := set(args.only) - set(COMPONENTS):
+        parser.error(f"unknown components: {sorted(unknown)}")
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        start = time.perf_counter()
+        models = EngineModels(tiny_config(args.models, directory / "db", args.max_new_tokens))
+        load = time.perf_counter() - start
+
+        results = {"load": {"seconds": load, **models.timings}}
+        for name in args.only:
+            print(f"Running {name}...")
+            results.update(BENCHMARKS[name](models, args, directory))
+        models.close()
+
+    report = {
+        "environment": environment(),
+        "args": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+        "results": results,
+    }
+    print(f"{'benchmark':<32} | {'p50, ms':>9} | {'p95, ms':>9} | {'p99, ms':>9} | {'items/s':>10}")
+    for name, r in results.items():
+        if "p50_ms" in r:
+            print(f"{name:<32} | {r['p50_ms']:>9.3f} | {r['p95_ms']:>9.3f} | {r['p99_ms']:>9.3f} | {r['throughput']:>10.1f}")
+    print(f"peak RSS: {peak_rss_mb():.1f} MB")
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Callable
+
+import numpy as np
+import psutil
+
+
+def summarize(latencies: list[float], items: int = 1) -> dict:
+    """Latency percentiles in milliseconds and throughput in items per second
+
+    :param list[float] latencies: latencies in seconds
+    :param int items: items processed per call, defaults to 1
+    :return dict: summary
+    """
+    values = np.array(latencies)
+    return {
+        "calls": len(values),
+        "p50_ms": float(np.percentile(values, 50) * 1000),
+        "p95_ms": float(np.percentile(values, 95) * 1000),
+        "p99_ms": float(np.percentile(values, 99) * 1000),
+        "mean_ms": float(values.mean() * 1000),
+        "throughput": float(items * len(values) / values.sum()) if values.sum() else 0.0,
+    }
+
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 1, items: int = 1) -> dict:
+    """Time repeated calls of fn
+
+    :param Callable[[], object] fn: benchmarked call
+    :param int repeat: number of timed calls
+    :param int warmup: number of untimed calls before, defaults to 1
+    :param int items: items processed per call, defaults to 1
+    :return dict: latency summary with memory usage
+    """
+    for _ in range(warmup):
+        fn()
+    rss = rss_mb()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return {**summarize(latencies, items), "rss_delta_mb": rss_mb() - rss, "peak_rss_mb": peak_rss_mb()}
+
+
+def rss_mb() -> float:
+    return psutil.Process().memory_info().rss / 2**20
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    import faiss
+    import torch
+    import transformers
+    return {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": psutil.cpu_count(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "transformers": transformers.__version__,
+        "faiss": faiss.__version__,
+    }
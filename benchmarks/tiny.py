@@ -0,0 +1,164 @@
+"""Tiny randomly initialized stand-ins for the master, NER and embedding
+models. They are built offline from the scripted cases, keep the real
+architectures and interfaces, and run on CPU in milliseconds."""
+from pathlib import Path
+
+import torch
+from sentence_transformers import SentenceTransformer, models as st_models
+from tokenizers import Tokenizer, decoders, models, normalizers, pre_tokenizers, processors, trainers
+from transformers import (
+    BertConfig,
+    BertForTokenClassification,
+    BertModel,
+    PreTrainedTokenizerFast,
+    Qwen3Config,
+    Qwen3ForCausalLM,
+)
+
+from benchmarks.cases import DND_TEST_CASES
+from src.engine.config import EngineConfig
+from src.ml.inference.master import GenerationConfig, MasterConfig, Message, SystemPrompt
+from src.ml.inference.ner import NerEntityType
+
+PREAMBULAR = DND_TEST_CASES[0]["context"]
+
+
+def corpus() -> list[str]:
+    prompt = SystemPrompt(preambular=PREAMBULAR)
+    texts = [prompt.make(Message(context=case["context"], statement=case["prompt"])) for case in DND_TEST_CASES]
+    return texts + ["[END]"]
+
+
+def wordpiece(texts: list[str]) -> PreTrainedTokenizerFast:
+    special = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+    tokenizer = Tokenizer(models.WordPiece(unk_token="[UNK]")) # type: ignore
+    tokenizer.normalizer = normalizers.BertNormalizer(lowercase=True) # type: ignore
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer() # type: ignore
+    tokenizer.decoder = decoders.WordPiece() # type: ignore
+    tokenizer.train_from_iterator(texts, trainers.WordPieceTrainer(vocab_size=1000, special_tokens=special)) # type: ignore
+    cls, sep = tokenizer.token_to_id("[CLS]"), tokenizer.token_to_id("[SEP]")
+    tokenizer.post_processor = processors.TemplateProcessing( # type: ignore
+        single="[CLS] $A [SEP]",
+        pair="[CLS] $A [SEP] $B:1 [SEP]:1",
+        special_tokens=[("[CLS]", cls), ("[SEP]", sep)]
+    )
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        unk_token="[UNK]", pad_token="[PAD]", cls_token="[CLS]", sep_token="[SEP]", mask_token="[MASK]",
+        model_max_length=512
+    )
+
+
+def byte_bpe(texts: list[str]) -> PreTrainedTokenizerFast:
+    tokenizer = Tokenizer(models.BPE()) # type: ignore
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False) # type: ignore
+    tokenizer.decoder = decoders.ByteLevel() # type: ignore
+    tokenizer.train_from_iterator(texts, trainers.BpeTrainer( # type: ignore
+        vocab_size=1000,
+        special_tokens=["<|endoftext|>"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet()
+    ))
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        eos_token="<|endoftext|>", pad_token="<|endoftext|>",
+        model_max_length=8192
+    )
+
+
+def bert_config(vocab_size: int, **kwargs) -> BertConfig:
+    return BertConfig(
+        vocab_size=vocab_size,
+        hidden_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=128,
+        **kwargs
+    )
+
+
+def make_master(directory: Path, texts: list[str]):
+    tokenizer = byte_bpe(texts)
+    model = Qwen3ForCausalLM(Qwen3Config(
+        vocab_size=len(tokenizer),
+        hidden_size=64,
+        intermediate_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        head_dim=16,
+        max_position_embeddings=8192,
+        tie_word_embeddings=True,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id,
+    ))
+    model.generation_config.eos_token_id = tokenizer.eos_token_id
+    model.generation_config.pad_token_id = tokenizer.pad_token_id
+    tokenizer.save_pretrained(directory)
+    model.save_pretrained(directory)
+
+
+def make_ner(directory: Path, texts: list[str]):
+    tokenizer = wordpiece(texts)
+    labels = ["O"] + [
+        f"{prefix}-{entity_type.value}"
+        for entity_type in NerEntityType if entity_type != NerEntityType.UNKNOWN
+        for prefix in "BI"
+    ]
+    model = BertForTokenClassification(bert_config(
+        len(tokenizer),
+        num_labels=len(labels),
+        id2label=dict(enumerate(labels)),
+        label2id={label: i for i, label in enumerate(labels)},
+    ))
+    tokenizer.save_pretrained(directory)
+    model.save_pretrained(directory)
+
+
+def make_embedding(directory: Path, texts: list[str]):
+    tokenizer = wordpiece(texts)
+    transformer = directory / "transformer"
+    tokenizer.save_pretrained(transformer)
+    BertModel(bert_config(len(tokenizer))).save_pretrained(transformer)
+    word = st_models.Transformer(transformer.as_posix())
+    pooling = st_models.Pooling(word.get_word_embedding_dimension())
+    SentenceTransformer(modules=[word, pooling], device="cpu").save(directory.as_posix())
+
+
+def make_tiny_models(directory: Path) -> dict[str, Path]:
+    """Build tiny models once, reuse them on later calls
+
+    :param Path directory: models directory
+    :return dict[str, Path]: model directories by role
+    """
+    paths = {name: directory / name for name in ("master", "ner", "embedding")}
+    makers = {"master": make_master, "ner": make_ner, "embedding": make_embedding}
+    texts = corpus()
+    torch.manual_seed(0)
+    for name, path in paths.items():
+        if (path / "config.json").exists():
+            continue
+        path.mkdir(parents=True, exist_ok=True)
+        makers[name](path, texts)
+    return paths
+
+
+def tiny_config(directory: Path, vector_db_path: Path, max_new_tokens: int = 32, **kwargs) -> EngineConfig:
+    """Engine config over tiny models
+
+    :param Path directory: models directory
+    :param Path vector_db_path: vector db directory
+    :param int max_new_tokens: generation length, defaults to 32
+    :return EngineConfig: engine config
+    """
+    paths = make_tiny_models(directory)
+    return EngineConfig(
+        vector_db_path=vector_db_path,
+        master_config=MasterConfig(
+            path=paths["master"],
+            preambular=PREAMBULAR,
+            generation_config=GenerationConfig(temperature=0.7, max_new_tokens=max_new_tokens),
+        ),
+        ner_model_path=paths["ner"],
+        embedding_model_path=paths["embedding"],
+        **kwargs
+    )
@@ -1,21 +1,41 @@
 import hashlib
-from typing import Optional
+import os
+import threading
+import time
+from pathlib import Path
+from queue import Empty, Queue
+from typing import Callable, Optional
+from urllib.parse import parse_qs, urlparse
+
+import joblib
+from bs4 import BeautifulSoup
 from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
-from urllib.parse import urlparse, parse_qs
-from bs4 import BeautifulSoup
-import time
-import joblib
-from pathlib import Path
-import time
 from treelib import Tree
 from loguru import logger
 
+CONTENT = 'div[style*="padding:0px 30px 50px 30px"]'
+SKIP_OPTIONS = ('go back', 'exit', 'reset')
+
+# click path from the story start to a page and the id of its parent node
+Task = tuple[Optional[str], tuple[str, ...]]
+
+
+def headless_chrome() -> WebDriver:
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless=new')
+    return webdriver.Chrome(options=options)
+
+
 class Page:
-    def __init__(self, driver: webdriver.Chrome):
+    def __init__(self, driver: WebDriver, wait: float = 10):
         self.driver = driver
-    
+        self.wait = WebDriverWait(driver, wait, poll_frequency=0.05)
+
     @property
     def soup(self) -> BeautifulSoup:
         return BeautifulSoup(self.driver.page_source, 'html.parser')
@@ -23,114 +43,246 @@ class Page:
     @property
     def hash(self) -> str:
         try:
-            content = self.driver.find_element(By.CSS_SELECTOR, 'div[style*="padding:0px 30px 50px 30px"]').text
+            content = self.driver.find_element(By.CSS_SELECTOR, CONTENT).text
             return hashlib.md5(content.encode()).hexdigest()
         except Exception as e:
             logger.error(e)
             return ""
 
-short_fantasy_quests = ''
+    def open(self, url: str):
+        """Start the story from scratch and wait for its first page"""
+        self.driver.delete_all_cookies()
+        self.driver.get(url)
+        self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, CONTENT)))
+
+    def click(self, option: str):
+        """Follow an option and wait until the page content changes"""
+        hsh = self.hash
+        self.driver.find_element(By.LINK_TEXT, option).click()
+        self.wait.until(lambda d: self._changed(hsh))
+
+    def _changed(self, hsh: str) -> bool:
+        try:
+            content = self.driver.find_element(By.CSS_SELECTOR, CONTENT).text
+        except WebDriverException:
+            return False
+        return hashlib.md5(content.encode()).hexdigest() != hsh
+
 
 class ChooseYourStoryParser:
-    def __init__(self, timeout: Optional[int] = 60*10):
-        self.driver = webdriver.Chrome()
-        self.wait = WebDriverWait(self.driver, 10)
-        self.page = Page(self.driver)
+    """Crawls a story into a tree of pages with a pool of browsers.
+
+    Pages to visit form a frontier of click paths. Each worker reaches a
+    page by replaying its path from the story start, so branches are
+    independent. The tree and the frontier are checkpointed periodically,
+    and an interrupted crawl resumes from the checkpoint.
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[int] = 60*10,
+        workers: int = 1,
+        driver_factory: Callable[[], WebDriver] = webdriver.Chrome,
+        wait: float = 10,
+        checkpoint_interval: float = 30,
+        retries: int = 2
+    ):
+        """
+        :param Optional[int] timeout: crawl time limit in seconds, defaults to 10 minutes
+        :param int workers: number of browsers, defaults to 1
+        :param Callable[[], WebDriver] driver_factory: creates a browser, defaults to Chrome
+        :param float wait: page load timeout in seconds, defaults to 10
+        :param float checkpoint_interval: seconds between checkpoints, defaults to 30
+        :param int retries: attempts per page after the first failure, defaults to 2
+        """
+        self.timeout = timeout
+        self.workers = workers
+        self.driver_factory = driver_factory
+        self.wait = wait
+        self.checkpoint_interval = checkpoint_interval
+        self.retries = retries
         self.tree = Tree()
         self.start: Optional[float] = None
-        self.timeout = timeout
 
-    def div(self):
-        return self.page.soup.find('div', style=lambda x: x and 'padding:0px 30px 50px 30px' in x) # type: ignore
-    
+        self._frontier: Queue[tuple[Task, int]] = Queue()
+        self._active: dict[int, Task] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def div(self, soup: BeautifulSoup):
+        return soup.find('div', style=lambda x: x and 'padding:0px 30px 50px 30px' in x) # type: ignore
+
     def text(self, div) -> str:
         text = ' '.join([p.get_text(strip=True) for p in div.find_all('p') if p.get_text(strip=True)]) # type: ignore
         return text
-    
+
     def options(self, div) -> list[str]:
         options = div.find_all('a', onclick=lambda x: x and 'PostBack' in x) # type: ignore
         options_texts: list[str] = [option.get_text(strip=True) for option in options]
-        return [o for o in options_texts if o.lower().find('go back') == -1 or o.lower().find('exit') == -1 or o.lower().find('reset') == -1]
-    
-    def __wait(self, hsh: str):
-        time.sleep(.5)
-        self.wait.until(lambda d: hash(self.page) != hsh)
-    
-    def __back(self, root: bool):
-        hsh = self.page.hash
-        if not root:
-            self.driver.back()
-            self.__wait(hsh)
-    
-    def __check_timeout(self):
-        if self.start is None:
-            self.start = time.time()
-        delta = time.time() - self.start
-        if self.timeout and delta > self.timeout:
-            raise TimeoutError(f'Timeout reached: {delta}')
-
-
-    def _parse(self, parent: Optional[str], tag: str):
-        self.__check_timeout()
-        hsh = self.page.hash
-        if self.tree.contains(hsh):
-            logger.info(f"Node {hsh} already exists")
-            self.__back(parent is None)
-            self.__wait(hsh)
-            return
+        return [o for o in options_texts if not any(skip in o.lower() for skip in SKIP_OPTIONS)]
 
+    def _visit(self, page: Page, url: str, task: Task):
+        parent, path = task
+        page.open(url)
+        for option in path:
+            page.click(option)
 
+        hsh = page.hash
+        soup = page.soup
+        div = self.div(soup)
+        if not hsh or div is None:
+            raise ValueError(f"No story content at {list(path)}")
+        text = self.text(div)
+        options = self.options(div)
+
+        # the node and its children enter the tree and the frontier together,
+        # so a checkpoint never holds a node whose children are not pending
+        with self._lock:
+            if self.tree.contains(hsh):
+                logger.info(f"Node {hsh} already exists")
+                return
+            if parent is not None and not self.tree.contains(parent):
+                raise ValueError(f"Parent {parent} of {list(path)} is missing")
+            self.tree.create_node(
+                tag=path[-1] if path else 'root',
+                identifier=hsh,
+                parent=parent,
+                data=dict(text=text, path=list(path))
+            )
+            for option in options:
+                self._frontier.put(((hsh, path + (option,)), 0))
+        logger.success(f"Added node {hsh}")
+
+    def _work(self, url: str):
+        driver = self.driver_factory()
+        page = Page(driver, self.wait)
+        worker = threading.get_ident()
         try:
-            div = self.div()
-        except Exception as e:
-            logger.error(e)
-            self.__back(parent is None)
-            return
-        
-        try:
-            text = self.text(div)
-        except Exception as e:
-            logger.error(e)
-            self.__back(parent is None)
-            return
-        
+            while not self._stop.is_set():
+                # a task moves from the frontier to the active ones in one step
+                with self._lock:
+                    try:
+                        task, attempt = self._frontier.get_nowait()
+                    except Empty:
+                        task = None
+                    else:
+                        self._active[worker] = task
+                if task is None:
+                    self._stop.wait(0.05)
+                    continue
+                try:
+                    self._visit(page, url, task)
+                except Exception as e:
+                    logger.error(f"Failed {list(task[1])} (attempt {attempt + 1}): {e}")
+                    if self._stop.is_set():
+                        # keep it for the checkpoint
+                        self._frontier.put((task, attempt))
+                    elif attempt < self.retries:
+                        self._frontier.put((task, attempt + 1))
+                    if isinstance(e, WebDriverException):
+                        driver.quit()
+                        driver = self.driver_factory()
+                        page = Page(driver, self.wait)
+                finally:
+                    with self._lock:
+                        self._active.pop(worker, None)
+                    self._frontier.task_done()
+        finally:
+            driver.quit()
+
+    def pending(self) -> list[Task]:
+        """Tasks queued or in progress"""
+        with self._lock:
+            return self._pending()
+
+    def _pending(self) -> list[Task]:
+        with self._frontier.mutex:
+            queued = [task for task, _ in self._frontier.queue]
+        return list(self._active.values()) + queued
+
+    def checkpoint(self, path: Path, url: str):
+        """Atomically write the tree and the frontier, both taken in one
+        critical section so they are consistent with each other"""
+        with self._lock:
+            frontier = self._pending()
+            tmp = path.with_suffix('.tmp')
+            joblib.dump(dict(url=url, tree=self.tree, frontier=frontier), tmp)
+            os.replace(tmp, path)
+            nodes = self.tree.size()
+        logger.debug(f"Checkpoint: {nodes} nodes, {len(frontier)} pending")
+
+    def resume(self, path: Path) -> bool:
+        """Restore tree and frontier from a checkpoint
+
+        :param Path path: checkpoint file
+        :return bool: checkpoint was loaded
+        """
+        if not path.exists():
+            return False
+        state = joblib.load(path)
+        self.tree = state['tree']
+        for task in state['frontier']:
+            self._frontier.put((task, 0))
+        logger.info(f"Resumed {path}: {self.tree.size()} nodes, {len(state['frontier'])} pending")
+        return True
+
+    def _done(self, timeout: float) -> bool:
+        """Wait until every task is done or timeout passes"""
+        with self._frontier.all_tasks_done:
+            if self._frontier.unfinished_tasks:
+                self._frontier.all_tasks_done.wait(timeout)
+            return not self._frontier.unfinished_tasks
+
+    def _crawl(self, url: str, checkpoint: Path):
+        self.tree = Tree()
+        self._frontier = Queue()
+        if not self.resume(checkpoint):
+            self._frontier.put(((None, ()), 0))
+        self.start = time.time()
+        self._stop.clear()
+        threads = [
+            threading.Thread(target=self._work, args=(url,), name=f"crawler-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        last = time.time()
         try:
-            options = self.options(div)
-        except Exception as e:
-            logger.error(e)
-            self.__back(parent is None)
-            return
-        
-        self.tree.create_node(
-            tag=tag,
-            identifier=hsh,
-            parent=parent,
-            data=dict(text=text)
-        )
-        logger.success(f"Added node {hsh}")
+            while not self._done(timeout=1):
+                delta = time.time() - self.start
+                if self.timeout and delta > self.timeout:
+                    raise TimeoutError(f'Timeout reached: {delta}')
+                if not any(thread.is_alive() for thread in threads):
+                    raise RuntimeError('All crawler workers stopped')
+                if time.time() - last > self.checkpoint_interval:
+                    self.checkpoint(checkpoint, url)
+                    last = time.time()
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
 
-        for option in options:
-            try:
-                self.driver.find_element(By.LINK_TEXT, option).click()
-                self.__wait(hsh)
-                self._parse(hsh, option)
-            except Exception as e:
-                logger.error(e)
-        
-        self.__back(parent is None)
-    
     def save(self, path: Path):
         joblib.dump(self.tree, path)
 
-    
     def parse(self, url: str, directory: Path = Path(__file__).parent):
-        self.driver.get(url)
-        self.start = time.time()
+        """Crawl a story and save its tree as `<StoryId>.tree`. A checkpoint
+        `<StoryId>.checkpoint` is kept until the crawl is complete
+
+        :param str url: story start url
+        :param Path directory: output directory, defaults to the parser directory
+        """
+        idx = parse_qs(urlparse(url).query).get('StoryId', [hashlib.md5(url.encode()).hexdigest()])[0]
+        checkpoint = directory / f"{idx}.checkpoint"
         try:
-            self._parse(None, 'root')
+            self._crawl(url, checkpoint)
             logger.success(f"Done with {url}")
         except Exception as e:
             logger.error(e)
-        self.driver.quit()
-        idx = parse_qs(urlparse(url).query).get('StoryId', hashlib.md5(url.encode()).hexdigest())[0]
-        self.save(directory / f"{idx}.tree")
\ No newline at end of file
+        if self.pending():
+            self.checkpoint(checkpoint, url)
+            logger.warning(f"Crawl of {url} is incomplete, run again to resume from {checkpoint}")
+        elif checkpoint.exists():
+            checkpoint.unlink()
+        self.save(directory / f"{idx}.tree")
@@ -0,0 +1,92 @@
+"""Static stand-in of a story site for crawling without network access
+
+Pages keep the markup the parser relies on: the story text in the padded
+div and choices as postback links. Postbacks load the next page after a
+delay, like a round trip to the server. Some choices lead to an already
+visited page and every page has a "Go back" link that must be skipped.
+
+    python -m parser.stub --depth 4 --branching 3 --workers 4
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+from parser.parser import ChooseYourStoryParser, headless_chrome
+
+PAGE = """<html>
+<head><script>
+function __doPostBack(target) {{
+    setTimeout(function() {{ window.location.href = target + ".html"; }}, {delay});
+}}
+</script></head>
+<body><form>
+<div style="padding:0px 30px 50px 30px">
+<p>{text}</p>
+{links}
+</div>
+</form></body>
+</html>
+"""
+
+LINK = """<p><a href="#" onclick="__doPostBack('{target}'); return false;">{text}</a></p>"""
+
+
+def write_site(directory: Path, depth: int = 3, branching: int = 2, delay: int = 50) -> tuple[str, int]:
+    """Write a story of `depth` levels where each page has `branching` choices.
+    The last choice of every inner page below the root leads into the
+    leftmost branch, so the story is a graph rather than a tree.
+
+    :param Path directory: site directory
+    :param int depth: levels below the start page
+    :param int branching: choices per page
+    :param int delay: postback delay in milliseconds
+    :return tuple[str, int]: start url and number of distinct pages
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    pages = 0
+    level = ["p"]
+    for d in range(depth + 1):
+        children_level = []
+        for name in level:
+            children = [f"{name}_{i}" for i in range(branching)] if d < depth else []
+            links = [LINK.format(target=child, text=f"Choice {i} of {name}") for i, child in enumerate(children)]
+            if d > 0 and d < depth and branching > 1:
+                # merge into the leftmost page of the next level, also reached through its own branch
+                target = "p" + "_0" * (d + 1)
+                links[-1] = LINK.format(target=target, text=f"Follow to {target}")
+                children = children[:-1]
+            if d > 0:
+                links.append(LINK.format(target="p", text="Go back"))
+            page = PAGE.format(text=f"Page {name} at depth {d}.", links="\n".join(links), delay=delay)
+            (directory / f"{name}.html").write_text(page, encoding="utf-8")
+            pages += 1
+            children_level.extend(children)
+        level = children_level
+    return (directory / "p.html").as_uri() + "?StoryId=stub", pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--branching", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--timeout", type=int, default=120)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url, pages = write_site(Path(tmp) / "site", args.depth, args.branching)
+        crawler = ChooseYourStoryParser(
+            timeout=args.timeout,
+            workers=args.workers,
+            driver_factory=headless_chrome,
+            checkpoint_interval=5
+        )
+        crawler.parse(url, Path(tmp))
+        nodes = crawler.tree.size()
+        print(f"crawled {nodes} of {pages} pages")
+        if nodes != pages:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
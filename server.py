@@ -0,0 +1,141 @@
+"""HTTP server streaming master responses as server-sent events.
+Front ends in other processes share the models loaded here.
+
+    python server.py --port 8080
+
+    POST   /sessions/{session_id}          {"preambular": "..."} -> {"session_id": ..., "preambular": ...}
+    POST   /sessions/{session_id}/dialog   {"statement": "..."}  -> text/event-stream
+    DELETE /sessions/{session_id}
+    GET    /health
+
+Dialog streams send `message` events with response chunks and end with
+`done` (full response), `cancelled` (a newer turn of the session was
+submitted) or `error`. Closing the connection cancels generation. When
+too many turns are pending the server answers 503. Session ids name the
+session's memory directory and must be 1-64 letters, digits, `_` or `-`.
+"""
+import argparse
+import json
+
+from aiohttp import web
+
+from src.engine.aio import AsyncEngine, EngineBusy
+from src.engine.sessions import SESSION_ID
+from setup import sessions
+
+from loguru import logger
+
+ENGINE = web.AppKey("engine", AsyncEngine)
+
+
+def event(name: str, data: dict) -> bytes:
+    return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+
+
+async def body(request: web.Request) -> dict:
+    if not request.can_read_body:
+        return {}
+    try:
+        data = await request.json()
+    except json.JSONDecodeError:
+        raise web.HTTPBadRequest(text="Body must be JSON")
+    if not isinstance(data, dict):
+        raise web.HTTPBadRequest(text="Body must be a JSON object")
+    return data
+
+
+def valid_session_id(request: web.Request) -> str:
+    value = request.match_info["session_id"]
+    if not SESSION_ID.fullmatch(value):
+        raise web.HTTPBadRequest(text="session id must be 1-64 letters, digits, '_' or '-'")
+    return value
+
+
+async def create_session(request: web.Request) -> web.Response:
+    session_id = valid_session_id(request)
+    data = await body(request)
+    engine = await request.app[ENGINE].session(session_id, data.get("preambular"))
+    return web.json_response({"session_id": session_id, "preambular": engine.prompt.preambular})
+
+
+async def drop_session(request: web.Request) -> web.Response:
+    await request.app[ENGINE].drop(valid_session_id(request))
+    return web.Response(status=204)
+
+
+async def dialog(request: web.Request) -> web.StreamResponse:
+    session_id = valid_session_id(request)
+    data = await body(request)
+    statement = str(data.get("statement", "")).strip()
+    if not statement:
+        raise web.HTTPBadRequest(text="statement is required")
+    try:
+        turn = await request.app[ENGINE].submit(session_id, statement, data.get("preambular"))
+    except EngineBusy as e:
+        raise web.HTTPServiceUnavailable(text=str(e), headers={"Retry-After": "1"})
+
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    try:
+        await response.prepare(request)
+        try:
+            async for chunk in turn:
+                await response.write(event("message", {"text": chunk}))
+        except ConnectionError:
+            raise
+        except Exception as e:
+            logger.error(f"Turn of session {session_id} failed: {e}")
+            await response.write(event("error", {"error": str(e)}))
+        else:
+            if turn.superseded or turn.response is None:
+                await response.write(event("cancelled", {}))
+            else:
+                await response.write(event("done", {"text": turn.response.text}))
+        await response.write_eof()
+    except ConnectionError:
+        logger.debug(f"Client of session {session_id} disconnected")
+    finally:
+        turn.cancel()
+    return response
+
+
+async def health(request: web.Request) -> web.Response:
+    engine = request.app[ENGINE]
+    return web.json_response({"sessions": len(engine.sessions), "pending": engine.pending, **engine.stats})
+
+
+def make_app(engine: AsyncEngine) -> web.Application:
+    app = web.Application()
+    app[ENGINE] = engine
+    app.add_routes([
+        web.post("/sessions/{session_id}", create_session),
+        web.delete("/sessions/{session_id}", drop_session),
+        web.post("/sessions/{session_id}/dialog", dialog),
+        web.get("/health", health),
+    ])
+
+    async def close(app: web.Application):
+        await app[ENGINE].close()
+        app[ENGINE].sessions.close()
+        app[ENGINE].sessions.models.close()
+
+    app.on_cleanup.append(close)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None, help="generation threads, defaults to config")
+    parser.add_argument("--max-pending", type=int, default=None, help="admitted turns, defaults to config")
+    args = parser.parse_args()
+
+    config = sessions.config.serving.model_copy(update={
+        key: value for key, value in (("workers", args.workers), ("max_pending", args.max_pending))
+        if value is not None
+    })
+    web.run_app(make_app(AsyncEngine(sessions, config)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
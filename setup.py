@@ -1,4 +1,5 @@
-from src.engine.engine import Engine, EngineConfig
+from src.engine.engine import EngineConfig, EngineModels
+from src.engine.sessions import SessionManager
 from src.ml.inference.master import MasterConfig, GenerationConfig
 from pathlib import Path
 
@@ -122,4 +123,5 @@ Will Riley uncover the Star’s secret before the city’s shadows swallow him w
     )
 )
 
-engine = Engine(config, debug=True) 
\ No newline at end of file
+models = EngineModels(config)
+sessions = SessionManager(config, models, debug=True)
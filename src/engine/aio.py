@@ -0,0 +1,229 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Optional
+
+from src.engine.config import ServingConfig
+from src.engine.engine import Engine
+from src.engine.sessions import SessionManager
+from src.ml.inference.master import MasterResponse
+
+from loguru import logger
+
+_END = object()
+
+
+class EngineBusy(Exception):
+    """Raised when no turn slot frees up within the queue timeout"""
+
+
+class TurnCancelled(Exception):
+    """Raised when a turn is superseded by a newer one in the same session"""
+
+
+class Turn:
+    """Turn admitted by AsyncEngine. Iterating it yields response chunks,
+    leaving the iteration early cancels generation"""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.response: Optional[MasterResponse] = None
+        self.superseded = False
+        self._cancel = threading.Event()
+        self._finished = asyncio.Event()
+        self._chunks: asyncio.Queue = asyncio.Queue()
+        self._future: Optional[asyncio.Future] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def done(self) -> bool:
+        return self._finished.is_set()
+
+    def cancel(self):
+        """Stop generation after the current token, the partial response is not memorized"""
+        if self._future is None or not self._future.done():
+            self._cancel.set()
+
+    async def wait(self):
+        """Wait until the worker thread is done with the turn"""
+        await self._finished.wait()
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        try:
+            while (chunk := await self._chunks.get()) is not _END:
+                yield chunk
+            self.response = await self._future # type: ignore
+        finally:
+            self.cancel()
+
+
+class AsyncEngine:
+    """Asyncio facade over a SessionManager.
+
+    Turns run on a pool of `workers` threads. At most `max_pending` turns
+    are admitted at a time, running or waiting for a worker; a new turn
+    waits up to `queue_timeout` seconds for a slot and is rejected with
+    EngineBusy after that. A new turn in a session cancels the one in
+    flight and starts once its thread is done, so an engine never runs
+    two turns at once.
+    """
+
+    def __init__(self, sessions: SessionManager, config: Optional[ServingConfig] = None):
+        """
+        :param SessionManager sessions: session engines
+        :param Optional[ServingConfig] config: workers and queue limits, defaults to `sessions.config.serving`
+        """
+        self.sessions = sessions
+        self.config = config or sessions.config.serving
+        self.stats = dict(admitted=0, rejected=0, superseded=0, cancelled=0, completed=0, failed=0)
+        self._executor = ThreadPoolExecutor(max_workers=self.config.workers, thread_name_prefix="engine")
+        self._slots = asyncio.Semaphore(self.config.max_pending)
+        self._turns: dict[str, Turn] = {}
+
+    @property
+    def pending(self) -> int:
+        """Admitted turns that are not done yet"""
+        return len(self._turns)
+
+    async def submit(self, session_id: str, statement: str, preambular: Optional[str] = None) -> Turn:
+        """Admit a turn and start it on the worker pool
+
+        :param str session_id: session identifier
+        :param str statement: user statement
+        :param Optional[str] preambular: story hook for a new session, defaults to config preambular
+        :raises EngineBusy: no slot within the queue timeout
+        :return Turn: running turn
+        """
+        previous = self._turns.get(session_id)
+        if previous is not None:
+            self._supersede(previous)
+        await self._acquire()
+        try:
+            # another turn of the session may have been admitted while waiting for a slot
+            while (previous := self._turns.get(session_id)) is not None:
+                self._supersede(previous)
+                await previous.wait()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        turn = Turn(session_id)
+        self._turns[session_id] = turn
+        self.stats["admitted"] += 1
+        loop = asyncio.get_running_loop()
+        turn._future = loop.run_in_executor(self._executor, self._run, turn, statement, preambular, loop)
+        turn._future.add_done_callback(lambda future: self._finish(turn, future))
+        return turn
+
+    async def dialog_stream(self, session_id: str, statement: str, preambular: Optional[str] = None) -> AsyncIterator[str]:
+        """Stream master response, closing the stream cancels the turn
+
+        :param str session_id: session identifier
+        :param str statement: user statement
+        :param Optional[str] preambular: story hook for a new session, defaults to config preambular
+        :return AsyncIterator[str]: chunks of master response
+        """
+        turn = await self.submit(session_id, statement, preambular)
+        try:
+            async for chunk in turn:
+                yield chunk
+        finally:
+            turn.cancel()
+
+    async def dialog(self, session_id: str, statement: str, preambular: Optional[str] = None) -> MasterResponse:
+        """Generate master response
+
+        :param str session_id: session identifier
+        :param str statement: user statement
+        :param Optional[str] preambular: story hook for a new session, defaults to config preambular
+        :raises TurnCancelled: a newer turn of the session was submitted
+        :return MasterResponse: master response
+        """
+        turn = await self.submit(session_id, statement, preambular)
+        async for _ in turn:
+            pass
+        if turn.superseded or turn.response is None:
+            raise TurnCancelled(f"Turn of session {session_id} was superseded")
+        return turn.response
+
+    async def session(self, session_id: str, preambular: Optional[str] = None) -> Engine:
+        """Get session engine, creating it off the event loop
+
+        :param str session_id: session identifier
+        :param Optional[str] preambular: story hook for a new session, defaults to config preambular
+        :return Engine: session engine
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self.sessions.get, session_id, preambular)
+
+    async def drop(self, session_id: str):
+        """Cancel the turn in flight and close the session
+
+        :param str session_id: session identifier
+        """
+        turn = self._turns.get(session_id)
+        if turn is not None:
+            turn.cancel()
+            await turn.wait()
+        await asyncio.get_running_loop().run_in_executor(None, self.sessions.drop, session_id)
+
+    async def close(self):
+        """Cancel turns in flight and stop the worker pool. Sessions are left to their manager"""
+        turns = list(self._turns.values())
+        for turn in turns:
+            turn.cancel()
+        await asyncio.gather(*(turn.wait() for turn in turns))
+        self._executor.shutdown(wait=False)
+
+    async def _acquire(self):
+        if not self._slots.locked():
+            await self._slots.acquire()
+            return
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.config.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats["rejected"] += 1
+            raise EngineBusy(f"{self.pending} turns pending, try again later") from None
+
+    def _supersede(self, turn: Turn):
+        if not turn.superseded and not turn.done:
+            turn.superseded = True
+            self.stats["superseded"] += 1
+        turn.cancel()
+
+    def _run(self, turn: Turn, statement: str, preambular: Optional[str], loop: asyncio.AbstractEventLoop) -> Optional[MasterResponse]:
+        """Worker thread body, chunks are handed to the event loop as they come"""
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(turn._chunks.put_nowait, item)
+            except RuntimeError:
+                # event loop is closed
+                turn._cancel.set()
+
+        try:
+            if turn.cancelled:
+                return None
+            with self.sessions.use(turn.session_id, preambular) as engine:
+                stream = engine.dialog_stream(statement, turn._cancel)
+                while True:
+                    try:
+                        put(next(stream))
+                    except StopIteration as stop:
+                        return stop.value
+        finally:
+            put(_END)
+
+    def _finish(self, turn: Turn, future: asyncio.Future):
+        self._slots.release()
+        if self._turns.get(turn.session_id) is turn:
+            del self._turns[turn.session_id]
+        if future.cancelled() or future.exception() is not None:
+            self.stats["failed"] += 1
+            logger.error(f"Turn of session {turn.session_id} failed: {None if future.cancelled() else future.exception()}")
+        elif turn.cancelled:
+            self.stats["cancelled"] += 1
+        else:
+            self.stats["completed"] += 1
+        turn._finished.set()
@@ -0,0 +1,69 @@
+import json
+from typing import Generator, Iterable, Iterator, Optional
+
+import requests
+
+
+class RemoteSession:
+    """Session served by `server.py`. Front ends using it need no models"""
+
+    def __init__(self, url: str, session_id: str, preambular: Optional[str] = None, timeout: float = 300):
+        """
+        :param str url: server url, e.g. `http://127.0.0.1:8080`
+        :param str session_id: session identifier
+        :param Optional[str] preambular: story hook for a new session, defaults to server config
+        :param float timeout: seconds to wait for the server between chunks, defaults to 300
+        """
+        self.url = url.rstrip("/")
+        self.session_id = session_id
+        self.timeout = timeout
+        response = requests.post(
+            f"{self.url}/sessions/{session_id}",
+            json={"preambular": preambular} if preambular is not None else {},
+            timeout=timeout
+        )
+        response.raise_for_status()
+        self.preambular: str = response.json()["preambular"]
+
+    def dialog_stream(self, statement: str) -> Generator[str, None, str]:
+        """Stream master response, closing the generator cancels the turn on the server
+
+        :param str statement: user statement
+        :return Generator[str, None, str]: chunks of master response, returns full response
+        """
+        chunks: list[str] = []
+        with requests.post(
+            f"{self.url}/sessions/{self.session_id}/dialog",
+            json={"statement": statement},
+            stream=True,
+            timeout=self.timeout
+        ) as response:
+            response.raise_for_status()
+            for name, data in _events(response.iter_lines(decode_unicode=True)):
+                if name == "message":
+                    chunks.append(data["text"])
+                    yield data["text"]
+                elif name == "done":
+                    return data["text"]
+                elif name == "error":
+                    raise RuntimeError(data["error"])
+                elif name == "cancelled":
+                    break
+        return "".join(chunks).strip()
+
+    def drop(self):
+        requests.delete(f"{self.url}/sessions/{self.session_id}", timeout=self.timeout).raise_for_status()
+
+
+def _events(lines: Iterable[str]) -> Iterator[tuple[str, dict]]:
+    """Parse server-sent events into names and JSON data"""
+    name, data = "message", []
+    for line in lines:
+        if not line:
+            if data:
+                yield name, json.loads("\n".join(data))
+            name, data = "message", []
+        elif line.startswith("event:"):
+            name = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
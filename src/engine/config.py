@@ -0,0 +1,67 @@
+from pathlib import Path
+from typing import Optional
+
+from src.memory.db.compaction import CompactionConfig
+from src.memory.db.index import IndexConfig
+from src.ml.inference.master import MasterConfig
+from src.ml.inference.profile import InferenceProfile
+from src.ml.inference.scheduler import SchedulerConfig
+
+from pydantic import BaseModel, Field
+
+
+class LoadingConfig(BaseModel):
+    parallel: bool = Field(default=False)
+    lazy: bool = Field(default=False)
+    warmup: bool = Field(default=True)
+    mmap: bool = Field(default=False)
+
+
+class TracingConfig(BaseModel):
+    enabled: bool = Field(default=False)
+    path: Optional[Path] = Field(default=None)
+
+
+class ProfilesConfig(BaseModel):
+    master: InferenceProfile = Field(default_factory=InferenceProfile)
+    ner: InferenceProfile = Field(default_factory=InferenceProfile)
+    embedding: InferenceProfile = Field(default_factory=InferenceProfile)
+
+
+class ContextConfig(BaseModel):
+    max_tokens: int = Field(default=1024)
+    max_prompt_tokens: Optional[int] = Field(default=None)
+    recency_weight: float = Field(default=0.3)
+    recency_half_life: float = Field(default=10*60)
+    min_item_tokens: int = Field(default=16)
+    token_cache_size: int = Field(default=4096)
+
+
+class ServingConfig(BaseModel):
+    workers: int = Field(default=2)
+    max_pending: int = Field(default=16)
+    queue_timeout: float = Field(default=5)
+
+
+class EngineConfig(BaseModel):
+    short_memory_size: int = Field(default=5)
+    vector_db_path: Path
+    number_of_remind_items: int = Field(default=5)
+    master_config: MasterConfig
+    ner_model_path: Path
+    ner_batch_size: int = Field(default=32)
+    embedding_model_path: Path
+    embedding_cache_mb: float = Field(default=64)
+    embedding_cache_path: Optional[Path] = Field(default=None)
+    async_memorize: bool = Field(default=False)
+    memorize_queue_size: int = Field(default=32)
+    max_sessions: int = Field(default=256)
+    session_idle_timeout: float = Field(default=60*60)
+    scheduler: Optional[SchedulerConfig] = Field(default=None)
+    index: IndexConfig = Field(default_factory=IndexConfig)
+    compaction: Optional[CompactionConfig] = Field(default=None)
+    loading: LoadingConfig = Field(default_factory=LoadingConfig)
+    tracing: TracingConfig = Field(default_factory=TracingConfig)
+    context: ContextConfig = Field(default_factory=ContextConfig)
+    profiles: ProfilesConfig = Field(default_factory=ProfilesConfig)
+    serving: ServingConfig = Field(default_factory=ServingConfig)
@@ -0,0 +1,149 @@
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from pydantic import BaseModel
+
+from src.engine.config import ContextConfig
+from src.memory.db.storage import DbItem
+from src.memory.short.memory import QItem
+from src.ml.inference.master import MasterInference, Message, SystemPrompt
+
+from loguru import logger
+
+
+class Candidate(BaseModel):
+    text: str
+    distance: Optional[float] = None
+    created: Optional[float] = None
+
+
+class ContextAssembler:
+    """Builds message context from short and long term memory within a token budget.
+    Candidates are ranked by retrieval distance and recency, deduplicated and
+    truncated so the made prompt fits `max_prompt_tokens`"""
+
+    def __init__(self, config: ContextConfig, master: Callable[[], MasterInference]):
+        """
+        :param ContextConfig config: context config
+        :param Callable[[], MasterInference] master: master getter, called on first use
+        """
+        self.config = config
+        self._master = master
+        self._counts: OrderedDict[str, int] = OrderedDict()
+
+    def count(self, text: str) -> int:
+        """Number of master tokens in text, cached"""
+        if text in self._counts:
+            self._counts.move_to_end(text)
+            return self._counts[text]
+        n = self._master().count_tokens(text)
+        self._counts[text] = n
+        while len(self._counts) > self.config.token_cache_size:
+            self._counts.popitem(last=False)
+        return n
+
+    def candidates(self, short: list[QItem], reminded: list[tuple[DbItem, float]]) -> list[Candidate]:
+        return [Candidate(text=item.text, created=item.created) for item in short] + [
+            Candidate(text=item.text, distance=distance, created=item.meta.get("created"))
+            for item, distance in reminded
+        ]
+
+    def rank(self, candidates: list[Candidate]) -> list[Candidate]:
+        """Order candidates by score, short term items have no distance and count as fully relevant"""
+        now = time.time()
+        weight = self.config.recency_weight
+
+        def score(candidate: Candidate) -> float:
+            relevance = 1.0 if candidate.distance is None else 1 / (1 + max(candidate.distance, 0.0))
+            recency = 0.0 if candidate.created is None else 0.5 ** (
+                max(now - candidate.created, 0.0) / self.config.recency_half_life
+            )
+            return (1 - weight) * relevance + weight * recency
+
+        return sorted(candidates, key=score, reverse=True)
+
+    def budget(self, prompt: SystemPrompt, statement: str) -> int:
+        """Tokens left for context"""
+        if self.config.max_prompt_tokens is None:
+            return self.config.max_tokens
+        used = self.count(prompt.prefix) + self.count(prompt.suffix(Message(context="", statement=statement)))
+        return min(self.config.max_tokens, self.config.max_prompt_tokens - used)
+
+    def assemble(self, prompt: SystemPrompt, statement: str, candidates: list[Candidate]) -> Message:
+        """Message with the best ranked unique candidates that fit the budget.
+        Candidates are unique up to case, whitespace and punctuation: one that
+        is contained in a selected candidate is dropped, one that contains
+        selected candidates replaces them. A statement that does not fit
+        `max_prompt_tokens` on its own is truncated
+
+        :param SystemPrompt prompt: prompt the message is made with
+        :param str statement: user statement
+        :param list[Candidate] candidates: context candidates
+        :raises ValueError: system prompt alone exceeds `max_prompt_tokens`
+        :return Message: message for master
+        """
+        budget = self.budget(prompt, statement)
+        if budget <= 0:
+            return Message(context="", statement=self._fit(prompt, statement))
+
+        selected: list[str] = []
+        keys: list[str] = []
+        costs: list[int] = []
+        left = budget
+        for candidate in self.rank(candidates):
+            key = _normalize(candidate.text)
+            if not key or any(key in other for other in keys):
+                continue
+            # e.g. a remembered response next to its own sentences from long term memory
+            contained = [i for i, other in enumerate(keys) if other in key]
+            refund = sum(costs[i] for i in contained)
+            # joined by new lines
+            cost = self.count(candidate.text) + (1 if len(selected) > len(contained) else 0)
+            if cost <= left + refund:
+                for i in reversed(contained):
+                    del selected[i], keys[i], costs[i]
+                selected.append(candidate.text)
+                keys.append(key)
+                costs.append(cost)
+                left += refund - cost
+                continue
+            if contained:
+                continue
+            if left >= self.config.min_item_tokens:
+                selected.append(self._master().truncate_tokens(candidate.text, left - 1))
+            break
+
+        message = Message(context="\n".join(selected), statement=statement)
+        if self.config.max_prompt_tokens is not None:
+            # token boundaries may shift when texts are joined
+            while selected and self._master().count_tokens(prompt.make(message)) > self.config.max_prompt_tokens:
+                selected.pop()
+                message = Message(context="\n".join(selected), statement=statement)
+            if not selected:
+                message = Message(context="", statement=self._fit(prompt, statement))
+        logger.debug(f"Context: {len(selected)} of {len(candidates)} items, budget {budget} tokens")
+        return message
+
+    def _fit(self, prompt: SystemPrompt, statement: str) -> str:
+        """Statement cut so the prompt without context fits `max_prompt_tokens`"""
+        limit = self.config.max_prompt_tokens
+        if limit is None:
+            return statement
+        master = self._master()
+        fixed = master.count_tokens(prompt.make(Message(context="", statement="")))
+        if fixed >= limit:
+            raise ValueError(f"System prompt alone takes {fixed} tokens, max_prompt_tokens is {limit}")
+        room = limit - fixed
+        fitted = statement
+        while master.count_tokens(prompt.make(Message(context="", statement=fitted))) > limit and room > 0:
+            fitted = master.truncate_tokens(statement, room)
+            room -= 1
+        if fitted != statement:
+            logger.warning(f"Statement truncated to fit {limit} prompt tokens")
+        return fitted
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", text)).strip().lower()
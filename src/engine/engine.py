@@ -1,100 +1,222 @@
-from pathlib import Path
-
-from src.memory.db.storage import VectorDb
+import threading
+import time
+from typing import Generator, Optional
+
+from src.engine.config import EngineConfig
+from src.engine.context import ContextAssembler
+from src.engine.models import EngineModels
+from src.memory.db.storage import DbItem, VectorDb
 from src.memory.short.memory import ShortTermMemory
-from src.ml.inference.embedding import EmbeddingInference
-from src.ml.inference.master import MasterInference, Message, MasterConfig, MasterResponse
-from src.ml.inference.ner import NerInference
-
-from pydantic import BaseModel, Field
+from src.memory.writer import MemoryWriter
+from src.ml.inference.master import MasterInference, Message, MasterResponse
+from src.ml.inference.ner import NerEntityType, NerInference
+from src.telemetry.tracer import span
 
 from loguru import logger
 
-class EngineConfig(BaseModel):
-    short_memory_size: int = Field(default=5)
-    vector_db_path: Path
-    number_of_remind_items: int = Field(default=5)
-    master_config: MasterConfig
-    ner_model_path: Path
-    embedding_model_path: Path
-
 class Engine:
-    def __init__(self, config: EngineConfig, debug: bool = False):
+    def __init__(self, config: EngineConfig, debug: bool = False, models: Optional[EngineModels] = None):
+        """
+        :param EngineConfig config: engine config
+        :param bool debug: debug logging, defaults to False
+        :param Optional[EngineModels] models: shared models, loaded from config if None
+        """
         if debug != True:
             logger.level("INFO")
                 
         self.config = config
-        
-        self.master = MasterInference(config.master_config)
-        logger.debug('Loaded Master Model')
-        
-        self.ner = NerInference(config.ner_model_path)
-        logger.debug(f'Loaded Ner Model: {self.ner.meta}')
+
+        self.models = models if models is not None else EngineModels(config)
+        self.prompt = config.master_config.prompt
         
         self.short_memory = ShortTermMemory(config.short_memory_size)
+        self.context = ContextAssembler(config.context, lambda: self.models.master)
         
         self.db = VectorDb(
-            EmbeddingInference(config.embedding_model_path),
-            config.vector_db_path
+            self.models.ember,
+            config.vector_db_path,
+            config.index,
+            config.compaction
         )
         logger.debug('Loaded Vector DB')
+
+        self.writer = MemoryWriter(
+            self.memorize,
+            config.memorize_queue_size
+        ) if config.async_memorize else None
         
         logger.debug("Engine initialized")
 
-    def remind(self, text: str) -> list[str]:
-        """Get texts from long term memory
+    @property
+    def master(self) -> MasterInference:
+        return self.models.master
+
+    @property
+    def ner(self) -> NerInference:
+        return self.models.ner
+
+    def flush(self):
+        """Wait until all pending long term memory writes are done"""
+        if self.writer is not None:
+            self.writer.flush()
+
+    def close(self):
+        """Flush pending writes and stop background memorization"""
+        if self.writer is not None:
+            self.writer.close()
+
+    def remind(self, text: str, type: Optional[NerEntityType] = None) -> list[str]:
+        """Get texts from long term memory. Entities known under the type
+        filter are looked up by exact text, other queries go through vector search
 
         :param str text: query text 
+        :param Optional[NerEntityType] type: entity type filter for known entities, defaults to None
         :return list[str]: list of correlated texts from long term memory
         """
-        items = self.db.search(text, self.config.number_of_remind_items)
+        self.flush()
+        with span("remind", queries=1) as s:
+            # an entity known only under another type falls back to vector search too
+            items = self.db.lookup(text, type, self.config.number_of_remind_items)
+            known = bool(items)
+            if not known:
+                items = self.db.search(text, self.config.number_of_remind_items)
+            s.set(exact=int(known))
         logger.debug(f"Remind Items: {[item.text for item in items]}")
         return [item.text for item in items]
 
+    def remind_many(self, texts: list[str]) -> list[str]:
+        """Get texts from long term memory for several queries at once
+
+        :param list[str] texts: query texts
+        :return list[str]: unique correlated texts, closest first
+        """
+        return [item.text for item, _ in self.recall(texts)]
+
+    def recall(self, texts: list[str]) -> list[tuple[DbItem, float]]:
+        """Get items from long term memory for several queries at once
+
+        :param list[str] texts: query texts
+        :return list[tuple[DbItem, float]]: unique correlated items with distances, closest first.
+            Items of known entities come first with zero distance
+        """
+        self.flush()
+        k = self.config.number_of_remind_items
+        with span("remind", queries=len(texts)) as s:
+            found: dict[str, tuple[DbItem, float]] = {}
+            unseen: list[str] = []
+            for text in texts:
+                if not self.db.knows(text):
+                    unseen.append(text)
+                    continue
+                for item in self.db.lookup(text, k=k):
+                    found.setdefault(item.text, (item, 0.0))
+            for item, distance in self.db.search_many(unseen, k):
+                found.setdefault(item.text, (item, distance))
+            items = sorted(found.values(), key=lambda x: x[1])
+            s.set(items=len(items), exact=len(texts) - len(unseen))
+        logger.debug(f"Remind Items: {[item.text for item, _ in items]}")
+        return items
+
     def memorize(self, text: str):
-        """Add text to long term memory
+        """Add text to long term memory. Each unique sentence with entities
+        is stored once, with all of its entities in metadata
 
         :param str text: text to add
         """
+        with span("memorize") as s:
+            sentences = list(dict.fromkeys(
+                sentence.strip() for sentence in text.split(".") if sentence.strip()
+            ))
+            texts: list[str] = []
+            metas: list[dict] = []
+            created = time.time()
+            for sentence, entities in zip(sentences, self.ner.extract_batch(sentences, self.config.ner_batch_size)):
+                logger.debug(f"Entities: {entities}")
+                if not entities:
+                    continue
+                texts.append(sentence)
+                unique = {(e.text, e.type): e for e in entities}
+                metas.append({
+                    "entities": [e.model_dump(mode="json") for e in unique.values()],
+                    "created": created
+                })
+            with span("db.add", items=len(texts)):
+                self.db.add_many(texts, metas)
+                self.db.save()
+            s.set(sentences=len(sentences), items=len(texts))
+
+    def _message(self, statement: str) -> Message:
+        """Collect context for statement from short and long term memory
+        within the context token budget
+
+        :param str statement: user statement
+        :return Message: message for master
+        """
+        entities = self.ner.extract(statement)
+        logger.debug(f"Entities: {entities}")
+        reminded = self.recall(list(dict.fromkeys(e.text for e in entities)))
+        with span("context") as s:
+            candidates = self.context.candidates(self.short_memory.get(), reminded)
+            message = self.context.assemble(self.prompt, statement, candidates)
+            s.set(candidates=len(candidates))
+        logger.debug(f"Context: {message.context}")
+        return message
+
+    def _remember(self, response: MasterResponse):
+        """Put master response into short and long term memory
+
+        :param MasterResponse response: master response
+        """
+        self.short_memory.add(response.text)
 
-        for sentence in text.split("."):
-            if sentence.strip() == "":
-                continue
-            entities = self.ner.extract(sentence)
-            logger.debug(f"Entities: {entities}")
-            for e in entities:
-                self.db.add(sentence, {"type": e.type, "text": e.text})
+        if self.writer is not None:
+            self.writer.submit(response.text)
+        else:
+            self.memorize(response.text)
 
-    def dialog(self, statement: str) -> MasterResponse:
+    def dialog(self, statement: str, cancel: Optional[threading.Event] = None) -> MasterResponse:
         """Main dialog method 
 
         :param Step step: dialog step
+        :param Optional[threading.Event] cancel: stops generation when set, a cancelled turn is not memorized
         :return str: master response
         """
+        with span("dialog") as s:
+            response = self.models.generator.generate(self._message(statement), self.prompt, cancel=cancel)
 
-        context: set[str] = set()
+            if cancel is not None and cancel.is_set():
+                s.set(cancelled=True)
+                return response
 
-        context.update(item.text for item in self.short_memory.get())
-
-        entities = self.ner.extract(statement)
-        logger.debug(f"Entities: {entities}")
-        for e in entities:
-            context.update(self.remind(e.text))
-        logger.debug(f"Context: {context}")
-        response = self.master.generate(Message(
-            context="\n".join(context),
-            statement=statement
-        ))
-
-        self.short_memory.add(response.text)
-
-        self.memorize(response.text)
+            self._remember(response)
 
         return response
 
-        
-
+    def dialog_stream(
+        self,
+        statement: str,
+        cancel: Optional[threading.Event] = None
+    ) -> Generator[str, None, MasterResponse]:
+        """Streaming dialog method. Memorization runs after the stream is exhausted,
+        a cancelled turn is not memorized
+
+        :param str statement: user statement
+        :param Optional[threading.Event] cancel: stops generation when set, defaults to None
+        :return Generator[str, None, MasterResponse]: chunks of master response, returns full response
+        """
+        with span("dialog", stream=True) as s:
+            chunks: list[str] = []
+            for chunk in self.models.generator.generate_stream(self._message(statement), self.prompt, cancel):
+                chunks.append(chunk)
+                yield chunk
 
+            response = MasterResponse(text="".join(chunks).strip())
 
+            if cancel is not None and cancel.is_set():
+                s.set(cancelled=True)
+                logger.debug(f"Cancelled turn after {len(chunks)} chunks")
+                return response
 
+            self._remember(response)
 
+        return response
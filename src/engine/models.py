@@ -0,0 +1,143 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Any, Callable, Optional
+
+from src.engine.config import EngineConfig
+from src.ml.inference.cache import EmbeddingCache
+from src.ml.inference.embedding import EmbeddingInference
+from src.ml.inference.master import MasterInference
+from src.ml.inference.ner import NerInference
+from src.ml.inference.scheduler import GenerationScheduler
+from src.telemetry.tracer import Exporter, HistogramExporter, JsonLinesExporter, tracer
+
+from loguru import logger
+
+
+class EngineModels:
+    """Stateless model holders, loaded once and shared between engines.
+
+    Models are loaded eagerly (serially or on a thread pool) or, with
+    `loading.lazy`, on first access. Load and warm-up time of each model
+    is kept in `timings`.
+    """
+
+    def __init__(self, config: EngineConfig):
+        self.config = config
+        self.timings: dict[str, float] = {}
+        self._models: dict[str, Any] = {}
+        self._loaders: dict[str, Callable[[], Any]] = {
+            "master": self._load_master,
+            "ner": self._load_ner,
+            "ember": self._load_ember,
+        }
+        self._locks = {name: Lock() for name in self._loaders}
+        self._scheduler: Optional[GenerationScheduler] = None
+        self._scheduler_lock = Lock()
+
+        self.histogram: Optional[HistogramExporter] = None
+        if config.tracing.enabled:
+            self.histogram = HistogramExporter()
+            exporters: list[Exporter] = [self.histogram]
+            if config.tracing.path is not None:
+                exporters.append(JsonLinesExporter(config.tracing.path))
+            tracer.configure(exporters)
+
+        if not config.loading.lazy:
+            self.load()
+
+    def load(self):
+        """Load all models that are not loaded yet"""
+        start = time.perf_counter()
+        names = [name for name in self._loaders if name not in self._models]
+        if self.config.loading.parallel:
+            with ThreadPoolExecutor(max_workers=len(names) or 1, thread_name_prefix="model-loader") as pool:
+                list(pool.map(self._get, names))
+        else:
+            for name in names:
+                self._get(name)
+        logger.info(f"Loaded models in {time.perf_counter() - start:.2f}s: {self.timings}")
+
+    @property
+    def master(self) -> MasterInference:
+        return self._get("master")
+
+    @property
+    def ner(self) -> NerInference:
+        return self._get("ner")
+
+    @property
+    def ember(self) -> EmbeddingInference:
+        return self._get("ember")
+
+    @property
+    def scheduler(self) -> Optional[GenerationScheduler]:
+        if self.config.scheduler is None:
+            return None
+        with self._scheduler_lock:
+            if self._scheduler is None:
+                self._scheduler = GenerationScheduler(self.master, self.config.scheduler)
+            return self._scheduler
+
+    @property
+    def generator(self) -> MasterInference | GenerationScheduler:
+        """Batching scheduler if configured, master model otherwise"""
+        return self.scheduler or self.master
+
+    def close(self):
+        """Stop the scheduler and close trace exporters configured by these models"""
+        if self._scheduler is not None:
+            self._scheduler.close()
+        if self.histogram is not None and self.histogram in tracer.exporters:
+            tracer.close()
+
+    def _get(self, name: str) -> Any:
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._locks[name]:
+            if name not in self._models:
+                start = time.perf_counter()
+                model = self._loaders[name]()
+                loaded = time.perf_counter()
+                if self.config.loading.warmup:
+                    model.warmup()
+                self.timings[name] = loaded - start
+                self.timings[f"{name}_warmup"] = time.perf_counter() - loaded
+                logger.debug(
+                    f"Loaded {name} in {self.timings[name]:.2f}s, "
+                    f"warm-up {self.timings[f'{name}_warmup']:.2f}s"
+                )
+                self._models[name] = model
+            return self._models[name]
+
+    def _load_master(self) -> MasterInference:
+        return MasterInference(
+            self.config.master_config,
+            mmap=self.config.loading.mmap,
+            profile=self.config.profiles.master
+        )
+
+    def _load_ner(self) -> NerInference:
+        return NerInference(
+            self.config.ner_model_path,
+            mmap=self.config.loading.mmap,
+            profile=self.config.profiles.ner
+        )
+
+    def _load_ember(self) -> EmbeddingInference:
+        profile = self.config.profiles.embedding
+        namespace = self.config.embedding_model_path.as_posix()
+        if profile.precision != "fp32":
+            # vectors of a converted model differ slightly, keep them apart
+            namespace = f"{namespace}:{profile.precision}"
+        return EmbeddingInference(
+            self.config.embedding_model_path,
+            EmbeddingCache(
+                namespace,
+                int(self.config.embedding_cache_mb * 2**20),
+                self.config.embedding_cache_path
+            ) if self.config.embedding_cache_mb > 0 else None,
+            safetensors=self.config.loading.mmap,
+            profile=profile
+        )
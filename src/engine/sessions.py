@@ -0,0 +1,194 @@
+import re
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from threading import Event, Lock
+from typing import Iterator, Optional
+
+from src.engine.config import EngineConfig
+from src.engine.engine import Engine
+from src.engine.models import EngineModels
+
+from loguru import logger
+
+# session ids become directory names under `vector_db_path`
+SESSION_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+class SessionManager:
+    """Isolated per-session engines over one set of shared models.
+
+    Sessions used through `use` are not evicted until their turn is done.
+    Engines are created and closed outside the manager lock; other callers
+    of a session wait until it is opened, and a session that is being
+    closed is reopened only after its memory is saved.
+    """
+
+    def __init__(self, config: EngineConfig, models: Optional[EngineModels] = None, debug: bool = False):
+        """
+        :param EngineConfig config: base config, each session stores its memory in `vector_db_path / session_id`
+        :param Optional[EngineModels] models: shared models, loaded from config if None
+        :param bool debug: debug logging, defaults to False
+        """
+        self.config = config
+        self.models = models if models is not None else EngineModels(config)
+        self.debug = debug
+        self._sessions: OrderedDict[str, tuple[Engine, float]] = OrderedDict()
+        self._users: Counter[str] = Counter()
+        self._dropping: set[str] = set()
+        self._opening: dict[str, Event] = {}
+        self._closing: dict[str, Event] = {}
+        self._lock = Lock()
+
+    def get(self, session_id: str, preambular: Optional[str] = None) -> Engine:
+        """Get session engine, create it on first access
+
+        :param str session_id: session identifier
+        :param Optional[str] preambular: story hook for a new session, defaults to config preambular
+        :raises ValueError: session id is not 1-64 letters, digits, `_` or `-`
+        :return Engine: session engine
+        """
+        return self._get(session_id, preambular, use=False)
+
+    @contextmanager
+    def use(self, session_id: str, preambular: Optional[str] = None) -> Iterator[Engine]:
+        """Get session engine and keep it from eviction while in use
+
+        :param str session_id: session identifier
+        :param Optional[str] preambular: story hook for a new session, defaults to config preambular
+        :raises ValueError: session id is not 1-64 letters, digits, `_` or `-`
+        :return Iterator[Engine]: session engine
+        """
+        engine = self._get(session_id, preambular, use=True)
+        try:
+            yield engine
+        finally:
+            evicted = []
+            with self._lock:
+                self._users[session_id] -= 1
+                if self._users[session_id] <= 0:
+                    del self._users[session_id]
+                    if session_id in self._dropping and session_id in self._sessions:
+                        evicted.append(self._pop(session_id))
+            self._close(evicted)
+
+    def drop(self, session_id: str):
+        """Close session and free its state. A session in use is closed once its turn is done
+
+        :param str session_id: session identifier
+        """
+        evicted = []
+        with self._lock:
+            if session_id in self._sessions:
+                if self._users[session_id]:
+                    self._dropping.add(session_id)
+                else:
+                    evicted.append(self._pop(session_id))
+        self._close(evicted)
+
+    def close(self):
+        """Close all sessions"""
+        with self._lock:
+            evicted = [self._pop(session_id) for session_id in list(self._sessions)]
+        self._close(evicted)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _get(self, session_id: str, preambular: Optional[str], use: bool) -> Engine:
+        if not SESSION_ID.fullmatch(session_id):
+            raise ValueError(f"Invalid session id {session_id!r}")
+        while True:
+            with self._lock:
+                # the session is being opened by another caller or its previous engine is still saving
+                busy = self._opening.get(session_id) or self._closing.get(session_id)
+                if busy is None:
+                    # taken out first so that idle eviction cannot close it under the caller
+                    engine: Optional[Engine] = self._sessions.pop(session_id, (None, 0.0))[0]
+                    evicted = self._evict_idle()
+                    if engine is None:
+                        self._opening[session_id] = Event()
+                    else:
+                        self._enter(session_id, engine, use)
+                        evicted += self._evict_over_capacity(session_id)
+                    break
+            busy.wait()
+        self._close(evicted)
+        if engine is None:
+            engine = self._open(session_id, preambular, use)
+        return engine
+
+    def _open(self, session_id: str, preambular: Optional[str], use: bool) -> Engine:
+        """Create session engine outside the lock, loading its memory may take a while"""
+        try:
+            engine = self._create(session_id, preambular)
+        except BaseException:
+            with self._lock:
+                self._opening.pop(session_id).set()
+            raise
+        with self._lock:
+            self._enter(session_id, engine, use)
+            evicted = self._evict_over_capacity(session_id)
+            self._opening.pop(session_id).set()
+        self._close(evicted)
+        return engine
+
+    def _enter(self, session_id: str, engine: Engine, use: bool):
+        """Register session as most recently used, under the lock"""
+        self._sessions[session_id] = (engine, time.monotonic())
+        self._dropping.discard(session_id)
+        if use:
+            self._users[session_id] += 1
+
+    def _create(self, session_id: str, preambular: Optional[str]) -> Engine:
+        master_config = self.config.master_config
+        if preambular is not None:
+            master_config = master_config.model_copy(update={"preambular": preambular})
+        config = self.config.model_copy(update={
+            "vector_db_path": self.config.vector_db_path / session_id,
+            "master_config": master_config,
+        })
+        logger.debug(f"Created session {session_id}")
+        return Engine(config, debug=self.debug, models=self.models)
+
+    def _evict_idle(self) -> list[tuple[str, Engine]]:
+        deadline = time.monotonic() - self.config.session_idle_timeout
+        evicted = []
+        for session_id, (_, accessed) in list(self._sessions.items()):
+            if accessed >= deadline:
+                break
+            if not self._users[session_id]:
+                evicted.append(self._pop(session_id))
+        return evicted
+
+    def _evict_over_capacity(self, requested: str) -> list[tuple[str, Engine]]:
+        # sessions in use are kept, so the limit may be exceeded until their turns are done
+        excess = len(self._sessions) - self.config.max_sessions
+        idle = [
+            session_id for session_id in self._sessions
+            if session_id != requested and not self._users[session_id]
+        ]
+        return [self._pop(session_id) for session_id in idle[:max(excess, 0)]]
+
+    def _pop(self, session_id: str) -> tuple[str, Engine]:
+        """Remove session under the lock, it is closed later by `_close`"""
+        engine, _ = self._sessions.pop(session_id)
+        self._dropping.discard(session_id)
+        self._closing[session_id] = Event()
+        return session_id, engine
+
+    def _close(self, evicted: list[tuple[str, Engine]]):
+        """Flush and save evicted engines outside the lock"""
+        for session_id, engine in evicted:
+            try:
+                engine.close()
+                engine.db.save()
+            except Exception as e:
+                logger.error(f"Failed to close session {session_id}: {e}")
+            finally:
+                with self._lock:
+                    self._closing.pop(session_id).set()
+            logger.debug(f"Evicted session {session_id}")
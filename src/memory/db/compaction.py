@@ -0,0 +1,79 @@
+import math
+from typing import Optional
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from src.memory.db.entities import EntityIndex
+
+
+class CompactionConfig(BaseModel):
+    """Near-duplicate merging and item cap of a VectorDb. `interval` is the
+    number of adds between rewrites that persist merged metadata and
+    access counters"""
+
+    similarity: Optional[float] = Field(default=0.95)
+    candidates: int = Field(default=4)
+    max_items: Optional[int] = Field(default=10000)
+    evict_fraction: float = Field(default=0.1)
+    half_life: float = Field(default=24*60*60)
+    access_weight: float = Field(default=0.5)
+    interval: Optional[int] = Field(default=200)
+
+
+def cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise cosine similarity of the rows of a and b"""
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return a @ b.T
+
+
+def merge_meta(target: dict, source: dict) -> list[dict]:
+    """Merge metadata of a near-duplicate into the item that is kept. Entities
+    are united, counters are summed and the duplicate refreshes the item
+
+    :param dict target: meta of the kept item, updated in place
+    :param dict source: meta of the duplicate
+    :return list[dict]: entities that were new to the kept item
+    """
+    added: list[dict] = []
+    if source.get("entities"):
+        entities = target.setdefault("entities", [])
+        known = {(EntityIndex.normalize(e.get("text", "")), e.get("type")) for e in entities}
+        for entity in source["entities"]:
+            key = (EntityIndex.normalize(entity.get("text", "")), entity.get("type"))
+            if key not in known:
+                known.add(key)
+                entities.append(entity)
+                added.append(entity)
+    target["seen"] = target.get("seen", 1) + source.get("seen", 1)
+    if source.get("hits"):
+        target["hits"] = target.get("hits", 0) + source["hits"]
+    if "created" in source:
+        target["created"] = min(target.get("created", source["created"]), source["created"])
+    updated = max((m.get("updated", m.get("created", 0.0)) for m in (target, source)), default=0.0)
+    if updated:
+        target["updated"] = updated
+    return added
+
+
+def touch(meta: dict, now: float):
+    """Count an access of the item"""
+    meta["hits"] = meta.get("hits", 0) + 1
+    meta["accessed"] = now
+
+
+def retention(meta: dict, now: float, config: CompactionConfig) -> float:
+    """Eviction score, items with the lowest scores go first. Recency of the
+    last write or access decays with `half_life`, frequent access and
+    repetition add to it logarithmically
+
+    :param dict meta: item meta
+    :param float now: current time
+    :param CompactionConfig config: compaction config
+    :return float: retention score
+    """
+    last = max(meta.get("accessed", 0.0), meta.get("updated", 0.0), meta.get("created", 0.0))
+    recency = 0.5 ** (max(now - last, 0.0) / config.half_life) if last else 0.0
+    frequency = math.log1p(meta.get("hits", 0) + meta.get("seen", 1) - 1)
+    return recency + config.access_weight * frequency
@@ -0,0 +1,73 @@
+import bisect
+import re
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from src.ml.inference.ner import NerEntityType
+
+
+class EntityIndex:
+    """Inverted index from normalized entity text and type to item ids.
+
+    It is derived from the `entities` metadata of stored items, so it is
+    rebuilt from `items.jsonl` on load instead of having a file of its own.
+    """
+
+    def __init__(self):
+        self._ids: defaultdict[str, defaultdict[NerEntityType, list[int]]] = defaultdict(lambda: defaultdict(list))
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return re.sub(r"\s+", " ", text).strip().lower()
+
+    def add(self, idx: int, entities: Iterable[dict]):
+        """Index item entities
+
+        :param int idx: item id
+        :param Iterable[dict] entities: entities as stored in item meta, with `text` and `type`
+        """
+        for entity in entities:
+            key = self.normalize(entity.get("text", ""))
+            if not key:
+                continue
+            ids = self._ids[key][_type(entity.get("type"))]
+            if not ids or ids[-1] < idx:
+                ids.append(idx)
+            elif idx not in ids:
+                # entities merged into an older item
+                bisect.insort(ids, idx)
+
+    def lookup(self, text: str, type: Optional[NerEntityType] = None) -> list[int]:
+        """Ids of items mentioning the entity, oldest first
+
+        :param str text: entity text
+        :param Optional[NerEntityType] type: entity type, any type if None
+        :return list[int]: item ids
+        """
+        types = self._ids.get(self.normalize(text))
+        if not types:
+            return []
+        if type is not None:
+            return list(types.get(type, []))
+        if len(types) == 1:
+            return list(next(iter(types.values())))
+        return sorted(set().union(*types.values()))
+
+    def types(self, text: str) -> set[NerEntityType]:
+        return set(self._ids.get(self.normalize(text), {}))
+
+    def clear(self):
+        self._ids.clear()
+
+    def __contains__(self, text: str) -> bool:
+        return self.normalize(text) in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+def _type(value) -> NerEntityType:
+    try:
+        return NerEntityType(value)
+    except ValueError:
+        return NerEntityType.UNKNOWN
@@ -0,0 +1,100 @@
+import math
+from enum import Enum
+from typing import Optional
+
+import faiss
+import numpy as np
+from pydantic import BaseModel, Field
+
+
+class IndexType(str, Enum):
+    FLAT = 'flat'
+    HNSW = 'hnsw'
+    IVF_FLAT = 'ivf_flat'
+    IVF_PQ = 'ivf_pq'
+
+
+class IndexMetric(str, Enum):
+    L2 = 'l2'
+    IP = 'ip'
+
+
+class IndexConfig(BaseModel):
+    type: IndexType = Field(default=IndexType.FLAT)
+    metric: IndexMetric = Field(default=IndexMetric.L2)
+    migrate_threshold: int = Field(default=10000)
+    hnsw_m: int = Field(default=32)
+    ef_construction: int = Field(default=40)
+    ef_search: int = Field(default=64)
+    nlist: Optional[int] = Field(default=None)
+    nprobe: int = Field(default=16)
+    pq_m: int = Field(default=16)
+    pq_bits: int = Field(default=8)
+
+    @property
+    def faiss_metric(self) -> int:
+        return faiss.METRIC_INNER_PRODUCT if self.metric == IndexMetric.IP else faiss.METRIC_L2
+
+
+def make_flat(config: IndexConfig, dimension: int) -> faiss.Index:
+    if config.metric == IndexMetric.IP:
+        return faiss.IndexFlatIP(dimension)
+    return faiss.IndexFlatL2(dimension)
+
+
+def make_index(config: IndexConfig, vectors: np.ndarray) -> faiss.Index:
+    """Build index of configured type, train it on vectors if needed and add them
+
+    :param IndexConfig config: index config
+    :param np.ndarray vectors: float32 matrix of shape (n, dimension), normalized for IP metric
+    :return faiss.Index: filled index
+    """
+    n, dimension = vectors.shape
+    match config.type:
+        case IndexType.FLAT:
+            index = make_flat(config, dimension)
+        case IndexType.HNSW:
+            index = faiss.IndexHNSWFlat(dimension, config.hnsw_m, config.faiss_metric)
+            index.hnsw.efConstruction = config.ef_construction
+        case IndexType.IVF_FLAT:
+            index = faiss.IndexIVFFlat(
+                make_flat(config, dimension), dimension, _nlist(config, n), config.faiss_metric
+            )
+        case IndexType.IVF_PQ:
+            index = faiss.IndexIVFPQ(
+                make_flat(config, dimension), dimension, _nlist(config, n),
+                config.pq_m, config.pq_bits, config.faiss_metric
+            )
+    if not index.is_trained:
+        index.train(vectors) # type: ignore
+    index.add(vectors) # type: ignore
+    tune(config, index)
+    return index
+
+
+def tune(config: IndexConfig, index: faiss.Index):
+    """Apply search-time parameters"""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = config.ef_search
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = config.nprobe
+
+
+def matches(config: IndexConfig, index: faiss.Index, migrated: bool) -> bool:
+    """Check if a loaded index is what config expects"""
+    if index.metric_type != config.faiss_metric:
+        return False
+    expected = {
+        IndexType.FLAT: faiss.IndexFlat,
+        IndexType.HNSW: faiss.IndexHNSW,
+        IndexType.IVF_FLAT: faiss.IndexIVFFlat,
+        IndexType.IVF_PQ: faiss.IndexIVFPQ,
+    }[config.type if migrated else IndexType.FLAT]
+    return isinstance(index, expected)
+
+
+def _nlist(config: IndexConfig, n: int) -> int:
+    if config.nlist is not None:
+        return config.nlist
+    # faiss wants ~39 training points per centroid
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
@@ -1,10 +1,17 @@
 import faiss
+import os
+import time
 from pathlib import Path
 import numpy as np
 from pydantic import BaseModel, Field
-from datetime import datetime
 import json
+from typing import Iterator, Optional
+from src.memory.db.compaction import CompactionConfig, cosine, merge_meta, retention, touch
+from src.memory.db.entities import EntityIndex
+from src.memory.db.index import IndexConfig, IndexMetric, IndexType, make_flat, make_index, matches, tune
 from src.ml.inference.embedding import EmbeddingInference
+from src.ml.inference.ner import NerEntityType
+from src.telemetry.tracer import span
 from loguru import logger
 
 
@@ -12,58 +19,462 @@ class DbItem(BaseModel):
     text: str
     vector: np.ndarray
     meta: dict = Field(default_factory=dict)
-    
+
     class Config:
         arbitrary_types_allowed = True
 
 class VectorDb:
-    def __init__(self, ember: EmbeddingInference, directory: Path):
+    """Vector store persisted as:
+
+    - `vectors.f32` – contiguous float32 matrix, one row per item
+    - `items.jsonl` – text and metadata, one line per item
+    - `index.faiss` – index snapshot, written on full save and on migration
+
+    Both data files are append-only, `save` writes only items added since
+    the previous save. On load, rows after the first record that fails to
+    decode or has no vector (e.g. cut by a crash) are dropped and the files
+    are rewritten by the next save; files that cannot be read at all are
+    moved aside. The index starts flat and migrates to the configured
+    ANN type once the number of items reaches `migrate_threshold`. Entities
+    from item metadata are kept in an exact-match `EntityIndex`.
+
+    With compaction, added items that are near-duplicates of stored ones
+    are merged into them, and once there are more than `max_items` items
+    the least retained ones are evicted. Merged metadata and access
+    counters of stored items are batched and persisted by a full rewrite
+    every `interval` adds, so saves in between stay appends; a crash loses
+    at most those updates. Eviction renumbers items and rewrites the files
+    on the next save. `compact` merges duplicates among all stored items
+    and is meant to be run as a periodic job.
+    """
+
+    def __init__(
+        self,
+        ember: EmbeddingInference,
+        directory: Path,
+        config: Optional[IndexConfig] = None,
+        compaction: Optional[CompactionConfig] = None
+    ):
+        """
+        :param EmbeddingInference ember: embedding model
+        :param Path directory: storage directory
+        :param Optional[IndexConfig] config: index config, defaults to flat L2
+        :param Optional[CompactionConfig] compaction: near-duplicate merging and item cap, defaults to None (keep everything)
+        """
         self._ember = ember
         self._directory = directory
-        self._directory.mkdir(exist_ok=True)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._config = config or IndexConfig()
+        self._compaction = compaction
+        self._adds = 0
+        self._dirty = False
 
-        self._index = faiss.IndexFlatL2(self.dimension)
+        self._index = make_flat(self._config, self.dimension)
         self._items: list[DbItem] = []
-    
+        self._entities = EntityIndex()
+        self._saved = 0
+        self._rewrite = False
+        self._load()
+
     def add(self, text: str, meta: dict = {}):
-        vector = self._ember.extract(text)
-        item = DbItem(text=text, vector=vector, meta=meta)
-        self._items.append(item)
-        self._index.add(vector) # type: ignore
+        self.add_many([text], [meta])
+
+    def add_many(self, texts: list[str], metas: list[dict], vectors: Optional[np.ndarray] = None):
+        """Add several texts with one embedding pass and one index insertion
+
+        :param list[str] texts: texts to add
+        :param list[dict] metas: metadata for each text
+        :param Optional[np.ndarray] vectors: precomputed embeddings, defaults to None (embed texts)
+        """
+        if len(texts) != len(metas):
+            raise ValueError(f"Got {len(texts)} texts and {len(metas)} metas")
+        if not texts:
+            return
+        vectors = self._prepare(self._ember.extract_batch(texts) if vectors is None else vectors)
+        if self._compaction is not None and self._compaction.similarity is not None:
+            keep = self._merge_duplicates(vectors, metas)
+            texts, metas, vectors = [texts[i] for i in keep], [metas[i] for i in keep], vectors[keep]
+            if not texts:
+                self._added()
+                return
+        for idx, meta in enumerate(metas, start=len(self._items)):
+            self._entities.add(idx, meta.get("entities", []))
+        self._items.extend(
+            DbItem(text=text, vector=vector.reshape(1, -1), meta=meta)
+            for text, vector, meta in zip(texts, vectors, metas)
+        )
+        self._index.add(vectors) # type: ignore
+        if not self._migrated and self._should_migrate:
+            self._migrate()
+        if self._over_capacity:
+            self._evict()
+        self._added()
 
     def search(self, query: str, k: int = 5) -> list[DbItem]:
-        vector = self._ember.extract(query)
-        distances, indices = self._index.search(
-            vector.reshape(1, -1).astype(np.float32),
-            k
-        ) # type: ignore
+        vector = self._prepare(self._ember.extract(query))
+        with span("db.search", queries=1, k=k, items=len(self._items)):
+            distances, indices = self._index.search(vector, k) # type: ignore
         if not self._items:
             return []
-        return [self._items[idx] for idx in indices[0]]
+        return self._touch([self._items[idx] for idx in indices[0] if idx >= 0])
+
+    def search_many(self, queries: list[str], k: int = 5) -> list[tuple[DbItem, float]]:
+        """Search several queries with one embedding pass and one index search
+
+        :param list[str] queries: query texts
+        :param int k: number of neighbours per query
+        :return list[tuple[DbItem, float]]: unique items with their best distance, closest first
+        """
+        if not queries or not self._items:
+            return []
+        vectors = self._prepare(self._ember.extract_batch(queries))
+        with span("db.search", queries=len(queries), k=k, items=len(self._items)):
+            distances, indices = self._index.search(vectors, k) # type: ignore
+        if self._config.metric == IndexMetric.IP:
+            distances = 1 - distances
+        best: dict[int, float] = {}
+        for distance, idx in zip(distances.ravel().tolist(), indices.ravel().tolist()):
+            if idx < 0:
+                continue
+            if idx not in best or distance < best[idx]:
+                best[idx] = distance
+        found = [
+            (self._items[idx], distance)
+            for idx, distance in sorted(best.items(), key=lambda x: x[1])
+        ]
+        self._touch([item for item, _ in found])
+        return found
+
+    def lookup(self, entity: str, type: Optional[NerEntityType] = None, k: Optional[int] = None) -> list[DbItem]:
+        """Items mentioning the entity by exact normalized text, newest first
+
+        :param str entity: entity text
+        :param Optional[NerEntityType] type: entity type, any type if None
+        :param Optional[int] k: maximum number of items, all if None
+        :return list[DbItem]: matching items
+        """
+        ids = self._entities.lookup(entity, type)[::-1]
+        return self._touch([self._items[idx] for idx in ids[:k]])
+
+    def knows(self, entity: str) -> bool:
+        """Entity has been stored with any item"""
+        return entity in self._entities
+
+    @property
+    def entities(self) -> EntityIndex:
+        return self._entities
 
     @property
     def dimension(self):
         return self._ember.dimension
-    
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[DbItem]:
+        return iter(self._items)
+
+    def compact(self) -> dict:
+        """Merge near-duplicates among all stored items, apply the item cap and
+        rewrite storage. Items are merged into the oldest of them
+
+        :return dict: item counts before and after, merged and evicted items
+        """
+        stats = dict(before=len(self._items), merged=0, evicted=0, after=len(self._items))
+        if self._compaction is None or not self._items:
+            return stats
+        with span("db.compact", items=len(self._items)):
+            keep = list(range(len(self._items)))
+            if self._compaction.similarity is not None:
+                vectors = self._vectors()
+                _, indices = self._index.search(vectors, self._compaction.candidates + 1) # type: ignore
+                merged: set[int] = set()
+                for i, neighbours in enumerate(indices.tolist()):
+                    if i in merged:
+                        continue
+                    candidates = [j for j in neighbours if j > i and j not in merged]
+                    if not candidates:
+                        continue
+                    similarity = cosine(vectors[i:i + 1], vectors[candidates])[0]
+                    for j, value in zip(candidates, similarity.tolist()):
+                        if value >= self._compaction.similarity:
+                            merge_meta(self._items[i].meta, self._items[j].meta)
+                            merged.add(j)
+                keep = [i for i in keep if i not in merged]
+                stats["merged"] = len(merged)
+            if self._compaction.max_items is not None and len(keep) > self._compaction.max_items:
+                stats["evicted"] = len(keep) - self._compaction.max_items
+                keep = self._retained(keep, self._compaction.max_items)
+            self._rebuild(keep)
+        self.save(full=True)
+        stats["after"] = len(self._items)
+        logger.info(f"Compacted {self._directory}: {stats}")
+        return stats
+
+    def _merge_duplicates(self, vectors: np.ndarray, metas: list[dict]) -> list[int]:
+        """Merge new items into stored or earlier new items they nearly duplicate
+
+        :param np.ndarray vectors: prepared vectors of new items
+        :param list[dict] metas: metadata of new items
+        :return list[int]: positions of new items to insert
+        """
+        threshold = self._compaction.similarity # type: ignore
+        indices = self._index.search(vectors, self._compaction.candidates)[1] if self._items else None # type: ignore
+        keep: list[int] = []
+        for i, vector in enumerate(vectors):
+            if indices is not None:
+                candidates = [j for j in indices[i].tolist() if j >= 0]
+                if candidates:
+                    similarity = cosine(vector[None], self._vectors(candidates))[0]
+                    best = int(similarity.argmax())
+                    if similarity[best] >= threshold:
+                        idx = candidates[best]
+                        self._entities.add(idx, merge_meta(self._items[idx].meta, metas[i]))
+                        self._dirty = True
+                        continue
+            if keep:
+                similarity = cosine(vector[None], vectors[keep])[0]
+                best = int(similarity.argmax())
+                if similarity[best] >= threshold:
+                    merge_meta(metas[keep[best]], metas[i])
+                    continue
+            keep.append(i)
+        if len(keep) < len(vectors):
+            logger.debug(f"Merged {len(vectors) - len(keep)} near-duplicate items")
+        return keep
+
+    def _added(self):
+        """Count an add, every `interval` adds pending metadata updates are
+        persisted by the next save"""
+        self._adds += 1
+        interval = self._compaction.interval if self._compaction is not None else None
+        if interval and self._adds % interval == 0 and self._dirty:
+            self._rewrite = True
+
+    @property
+    def _over_capacity(self) -> bool:
+        return (
+            self._compaction is not None
+            and self._compaction.max_items is not None
+            and len(self._items) > self._compaction.max_items
+        )
+
+    def _evict(self):
+        """Drop the least retained items down to `evict_fraction` below the cap,
+        so eviction, the index rebuild and the rewrite it needs happen once
+        per `evict_fraction * max_items` added items rather than on every add"""
+        limit = int(self._compaction.max_items * (1 - self._compaction.evict_fraction)) # type: ignore
+        with span("db.evict", items=len(self._items), limit=limit):
+            keep = self._retained(list(range(len(self._items))), limit)
+            evicted = len(self._items) - len(keep)
+            self._rebuild(keep)
+        self._rewrite = True
+        logger.info(f"Evicted {evicted} items, {len(self._items)} left")
+
+    def _retained(self, ids: list[int], limit: int) -> list[int]:
+        """Ids of at most `limit` items with the highest retention, in storage order"""
+        now = time.time()
+        scores = np.array([retention(self._items[idx].meta, now, self._compaction) for idx in ids]) # type: ignore
+        best = np.argsort(-scores, kind="stable")[:max(limit, 0)]
+        return sorted(ids[i] for i in best.tolist())
+
+    def _rebuild(self, keep: list[int]):
+        """Keep only the given items, renumbering them and rebuilding the
+        vector and entity indices. A migrated index is refilled without
+        training it again"""
+        if len(keep) == len(self._items):
+            return
+        self._items = [self._items[idx] for idx in keep]
+        self._entities.clear()
+        for idx, item in enumerate(self._items):
+            self._entities.add(idx, item.meta.get("entities", []))
+        if self._migrated:
+            self._index.reset()
+            if self._items:
+                self._index.add(self._vectors()) # type: ignore
+        else:
+            self._index = make_flat(self._config, self.dimension)
+            if self._should_migrate:
+                self._migrate()
+            elif self._items:
+                self._index.add(self._vectors()) # type: ignore
+        self._rewrite = True
+
+    def _vectors(self, ids: Optional[list[int]] = None) -> np.ndarray:
+        items = self._items if ids is None else [self._items[idx] for idx in ids]
+        return self._prepare(np.concatenate([item.vector for item in items]))
+
+    def _touch(self, items: list[DbItem]) -> list[DbItem]:
+        if self._compaction is not None:
+            now = time.time()
+            for item in items:
+                touch(item.meta, now)
+            self._dirty = self._dirty or bool(items)
+        return items
+
+    def _prepare(self, vectors: np.ndarray) -> np.ndarray:
+        """Contiguous float32 copy, L2-normalized for inner product metric"""
+        vectors = np.array(vectors, dtype=np.float32, order="C").reshape(-1, self.dimension)
+        if self._config.metric == IndexMetric.IP:
+            faiss.normalize_L2(vectors)
+        return vectors
+
+    @property
+    def _should_migrate(self) -> bool:
+        return self._config.type != IndexType.FLAT and len(self._items) >= self._config.migrate_threshold
+
+    @property
+    def _migrated(self) -> bool:
+        return not isinstance(self._index, faiss.IndexFlat)
+
+    def _migrate(self):
+        logger.info(f"Migrating {len(self._items)} items to {self._config.type.value} index")
+        self._index = make_index(
+            self._config,
+            self._prepare(np.concatenate([item.vector for item in self._items]))
+        )
+        try:
+            faiss.write_index(self._index, str(self._index_pth))
+        except Exception as e:
+            logger.error(f"Failed to write index: {e}")
+
+    @property
+    def _index_pth(self) -> Path:
+        return self._directory / "index.faiss"
+
+    @property
+    def _items_pth(self) -> Path:
+        return self._directory / "items.jsonl"
+
+    @property
+    def _vectors_pth(self) -> Path:
+        return self._directory / "vectors.f32"
+
     def _load(self):
-        index_pth = self._directory / "index.faiss"
-        items_pth = self._directory / "items.json"
-
-        if index_pth.exists() and items_pth.exists():
-            try:
-                self._index = faiss.read_index(str(index_pth))
-                with open(items_pth, "r", encoding="utf-8") as f:
-                    self._items = [DbItem.model_validate(item) for item in json.load(f)]
-            except Exception as e:
-                logger.error(f"Failed to load vector db: {e}")
-    
-    def save(self):
+        if not self._items_pth.exists() or not self._vectors_pth.exists():
+            return
+        if self._vectors_pth.stat().st_size == 0:
+            return
         try:
-            faiss.write_index(self._index, str(self._directory / "index.faiss"))
-            with open(self._directory / "items.json", "w", encoding="utf-8") as f:
-                json.dump([item.model_dump() for item in self._items], f, ensure_ascii=False, indent=2)
+            vectors = np.memmap(self._vectors_pth, dtype=np.float32, mode="r")
+            if vectors.size % self.dimension:
+                logger.warning("Vector file has a partial row, it will be rewritten")
+                self._rewrite = True
+            vectors = vectors[:vectors.size - vectors.size % self.dimension].reshape(-1, self.dimension)
+            records = self._read_records()
         except Exception as e:
-            logger.error(f"Failed to save vector db: {e}")
+            logger.error(f"Failed to load vector db: {e}")
+            self._set_aside()
+            return
+
+        if len(records) != len(vectors):
+            logger.warning(f"Vector db has {len(records)} items and {len(vectors)} vectors, truncating")
+            self._rewrite = True
+        n = min(len(records), len(vectors))
+
+        self._items = [
+            DbItem(text=record["text"], vector=vectors[i:i + 1], meta=record.get("meta", {}))
+            for i, record in enumerate(records[:n])
+        ]
+        for idx, item in enumerate(self._items):
+            self._entities.add(idx, item.meta.get("entities", []))
+        index = self._read_index(n)
+        if index is None:
+            self._index = make_flat(self._config, self.dimension)
+            if self._should_migrate:
+                self._migrate()
+            elif n:
+                self._index.add(self._prepare(vectors[:n])) # type: ignore
+        else:
+            # snapshot may lag behind appended items
+            if index.ntotal < n:
+                index.add(self._prepare(vectors[index.ntotal:n])) # type: ignore
+            tune(self._config, index)
+            self._index = index
+        self._saved = n
+        logger.debug(f"Loaded {n} items from {self._directory}")
+
+    def _read_records(self) -> list[dict]:
+        """Records up to the first line that fails to decode, e.g. one cut by a crash"""
+        records = []
+        with open(self._items_pth, "r", encoding="utf-8", errors="replace") as f:
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    if not isinstance(record, dict) or not isinstance(record.get("text"), str):
+                        raise ValueError("record has no text")
+                except ValueError as e:
+                    logger.warning(f"Broken record at line {number} of {self._items_pth}, dropping it and the rest: {e}")
+                    self._rewrite = True
+                    break
+                records.append(record)
+        return records
+
+    def _set_aside(self):
+        """Move files that failed to load out of the way, so saves start new ones"""
+        suffix = f".broken-{int(time.time())}"
+        for path in (self._items_pth, self._vectors_pth, self._index_pth):
+            if path.exists():
+                os.replace(path, path.with_name(path.name + suffix))
+        logger.warning(f"Moved unreadable vector db files in {self._directory} aside with suffix {suffix}")
 
+    def _read_index(self, n: int):
+        if not self._index_pth.exists():
+            return None
+        try:
+            index = faiss.read_index(str(self._index_pth))
+        except Exception as e:
+            logger.error(f"Failed to read index: {e}")
+            return None
+        if index.ntotal > n or index.d != self.dimension:
+            return None
+        if not matches(self._config, index, self._should_migrate):
+            return None
+        return index
+
+    def save(self, full: bool = False) -> bool:
+        """Persist items added since the last save
+
+        :param bool full: rewrite all files and the index snapshot, defaults to False
+        :return bool: False if writing failed, unsaved items are written by the next save
+        """
+        try:
+            if full or self._rewrite:
+                self._write_all()
+            else:
+                self._append(self._items[self._saved:])
+            self._saved = len(self._items)
+        except Exception as e:
+            logger.error(f"Failed to save vector db: {e}")
+            return False
+        return True
 
+    def _append(self, items: list[DbItem]):
+        if not items:
+            return
+        with open(self._vectors_pth, "ab") as f:
+            np.concatenate([item.vector for item in items]).astype(np.float32).tofile(f)
+        with open(self._items_pth, "a", encoding="utf-8") as f:
+            for item in items:
+                f.write(json.dumps({"text": item.text, "meta": item.meta}, ensure_ascii=False) + "\n")
 
+    def _write_all(self):
+        vectors_tmp = self._vectors_pth.with_suffix(".tmp")
+        items_tmp = self._items_pth.with_suffix(".tmp")
+        with open(vectors_tmp, "wb") as f:
+            for item in self._items:
+                item.vector.astype(np.float32).tofile(f)
+        with open(items_tmp, "w", encoding="utf-8") as f:
+            for item in self._items:
+                f.write(json.dumps({"text": item.text, "meta": item.meta}, ensure_ascii=False) + "\n")
+        os.replace(vectors_tmp, self._vectors_pth)
+        os.replace(items_tmp, self._items_pth)
+        faiss.write_index(self._index, str(self._index_pth))
+        self._rewrite = False
+        self._dirty = False
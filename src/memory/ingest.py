@@ -0,0 +1,202 @@
+"""Bulk ingestion of parsed story trees into long term memory
+
+    python -m src.memory.ingest parser/*.tree --db data/campaign --ner models/ner --embedding models/embedding
+"""
+import argparse
+import hashlib
+import re
+import time
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import joblib
+from treelib import Tree
+
+from src.memory.db.index import IndexConfig, IndexMetric, IndexType
+from src.memory.db.storage import VectorDb
+from src.ml.inference.embedding import EmbeddingInference
+from src.ml.inference.ner import NerInference
+
+from loguru import logger
+
+
+def sentences(text: str) -> list[str]:
+    """Unique sentences of text, split the same way as memorized responses"""
+    return list(dict.fromkeys(sentence.strip() for sentence in text.split(".") if sentence.strip()))
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(re.sub(r"\s+", " ", text).strip().lower().encode()).hexdigest()
+
+
+def passages(paths: Iterable[Path]) -> Iterator[tuple[str, str, str]]:
+    """Stream passages of saved trees, one tree in memory at a time
+
+    :param Iterable[Path] paths: `.tree` files
+    :return Iterator[tuple[str, str, str]]: tree name, node id and passage text
+    """
+    for path in paths:
+        try:
+            tree: Tree = joblib.load(path)
+        except Exception as e:
+            logger.error(f"Failed to load {path}: {e}")
+            continue
+        for node in tree.all_nodes_itr():
+            text = (node.data or {}).get("text", "")
+            if text:
+                yield path.stem, str(node.identifier), text
+        del tree
+
+
+class TreeIngestor:
+    """Writes story passages into a VectorDb in chunks.
+
+    Sentences go through batched NER and embedding, and like memorized
+    responses only sentences with entities are stored unless `keep_all`
+    is set. Hashes of ingested passages are appended to `ingested.txt` in
+    the db directory once their chunk is saved, so reruns and overlapping
+    trees skip them. Repeated sentences are skipped across the passages of
+    one ingestor, sentences already in the db are left to its compaction.
+    """
+
+    def __init__(
+        self,
+        db: VectorDb,
+        ner: NerInference,
+        chunk_size: int = 1024,
+        ner_batch_size: int = 32,
+        keep_all: bool = False
+    ):
+        """
+        :param VectorDb db: target db
+        :param NerInference ner: NER model
+        :param int chunk_size: sentences per write, defaults to 1024
+        :param int ner_batch_size: sentences per NER forward pass, defaults to 32
+        :param bool keep_all: store sentences without entities too, defaults to False
+        """
+        self.db = db
+        self.ner = ner
+        self.chunk_size = chunk_size
+        self.ner_batch_size = ner_batch_size
+        self.keep_all = keep_all
+        self.stats = dict(passages=0, skipped_passages=0, sentences=0, skipped_sentences=0, items=0, seconds=0.0)
+
+        self._passages = self._read_hashes()
+        self._sentences: set[str] = set()
+        self._buffer: list[tuple[str, dict]] = []
+        self._pending: list[str] = []
+        self._start = time.perf_counter()
+
+    @property
+    def _hashes_pth(self) -> Path:
+        return self.db.directory / "ingested.txt"
+
+    def _read_hashes(self) -> set[str]:
+        if not self._hashes_pth.exists():
+            return set()
+        with open(self._hashes_pth, "r", encoding="utf-8") as f:
+            return {line.strip() for line in f if line.strip()}
+
+    def ingest(self, paths: Iterable[Path]) -> dict:
+        """Ingest all passages of the trees
+
+        :param Iterable[Path] paths: `.tree` files
+        :return dict: counters and throughput
+        """
+        self._start = time.perf_counter()
+        for tree, node, text in passages(paths):
+            self.add(text, {"tree": tree, "node": node})
+        self.flush()
+        self.stats["seconds"] = time.perf_counter() - self._start
+        self.stats["sentences_per_s"] = self.stats["sentences"] / self.stats["seconds"] if self.stats["seconds"] else 0.0
+        logger.success(f"Ingested {self._report()}")
+        return self.stats
+
+    def add(self, text: str, source: dict):
+        """Buffer a passage, writing a chunk once the buffer is full
+
+        :param str text: passage text
+        :param dict source: passage origin kept in item metadata
+        """
+        passage = content_hash(text)
+        if passage in self._passages:
+            self.stats["skipped_passages"] += 1
+            return
+        self._passages.add(passage)
+        self._pending.append(passage)
+        self.stats["passages"] += 1
+        for sentence in sentences(text):
+            key = content_hash(sentence)
+            if key in self._sentences:
+                self.stats["skipped_sentences"] += 1
+                continue
+            self._sentences.add(key)
+            self._buffer.append((sentence, source))
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered sentences and record their passages as ingested.
+        If the db fails to save, the passages are recorded after the next successful save
+        """
+        texts = [text for text, _ in self._buffer]
+        created = time.time()
+        items: list[str] = []
+        metas: list[dict] = []
+        for (text, source), entities in zip(self._buffer, self.ner.extract_batch(texts, self.ner_batch_size)):
+            if not entities and not self.keep_all:
+                continue
+            unique = {(e.text, e.type): e for e in entities}
+            items.append(text)
+            metas.append({
+                "entities": [e.model_dump(mode="json") for e in unique.values()],
+                "created": created,
+                "source": source
+            })
+        self.db.add_many(items, metas)
+        self.stats["sentences"] += len(texts)
+        self.stats["items"] += len(items)
+        self._buffer.clear()
+        if not self.db.save():
+            logger.warning(f"{len(self._pending)} passages are not recorded as ingested until the db is saved")
+            return
+        with open(self._hashes_pth, "a", encoding="utf-8") as f:
+            f.writelines(f"{passage}\n" for passage in self._pending)
+        self._pending.clear()
+        if texts:
+            logger.info(f"Ingested chunk of {len(texts)} sentences, total {self._report()}")
+
+    def _report(self) -> str:
+        elapsed = time.perf_counter() - self._start
+        rate = self.stats["sentences"] / elapsed if elapsed else 0.0
+        return (
+            f"{self.stats['passages']} passages ({self.stats['skipped_passages']} skipped), "
+            f"{self.stats['sentences']} sentences ({self.stats['skipped_sentences']} repeated), "
+            f"{self.stats['items']} items, {rate:.1f} sentences/s"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trees", type=Path, nargs="+", help="saved .tree files")
+    parser.add_argument("--db", type=Path, required=True, help="vector db directory")
+    parser.add_argument("--ner", type=Path, required=True, help="NER model")
+    parser.add_argument("--embedding", type=Path, required=True, help="embedding model")
+    parser.add_argument("--index-type", type=IndexType, default=IndexType.FLAT)
+    parser.add_argument("--metric", type=IndexMetric, default=IndexMetric.L2)
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    parser.add_argument("--ner-batch-size", type=int, default=32)
+    parser.add_argument("--keep-all", action="store_true", help="store sentences without entities too")
+    args = parser.parse_args()
+
+    db = VectorDb(
+        EmbeddingInference(args.embedding),
+        args.db,
+        IndexConfig(type=args.index_type, metric=args.metric)
+    )
+    ingestor = TreeIngestor(db, NerInference(args.ner), args.chunk_size, args.ner_batch_size, args.keep_all)
+    ingestor.ingest(args.trees)
+
+
+if __name__ == "__main__":
+    main()
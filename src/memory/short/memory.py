@@ -1,3 +1,4 @@
+import time
 from collections import deque
 from datetime import datetime
 from typing import Optional
@@ -6,11 +7,16 @@ from pydantic import BaseModel, PrivateAttr
 class QItem(BaseModel):
     text: str
     _timestamp: str = PrivateAttr(default_factory=lambda: datetime.now().strftime("%H:%M:%S"))
+    _created: float = PrivateAttr(default_factory=time.time)
     
     @property
     def timestamp(self):
         return self._timestamp
 
+    @property
+    def created(self) -> float:
+        return self._created
+
 class ShortTermMemory:
     def __init__(self, size: int = 10):
         self.memory: deque[QItem] = deque([], maxlen=size)
@@ -0,0 +1,52 @@
+from queue import Queue
+from threading import Thread
+from typing import Callable, Optional
+
+from loguru import logger
+
+
+class MemoryWriter:
+    """Background worker that drains memory write jobs from a bounded queue"""
+
+    def __init__(self, write: Callable[[str], None], size: int = 32):
+        self._write = write
+        self._queue: Queue[Optional[str]] = Queue(maxsize=size)
+        self._thread = Thread(target=self._run, name="memory-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str):
+        """Schedule text to be written. Blocks while the queue is full
+
+        :param str text: text to write
+        """
+        if not self._thread.is_alive():
+            raise RuntimeError("Memory writer is closed")
+        self._queue.put(text)
+
+    def flush(self):
+        """Wait until all submitted texts are written"""
+        self._queue.join()
+
+    def close(self):
+        """Flush pending writes and stop the worker"""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._queue.join()
+        self._thread.join()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.unfinished_tasks
+
+    def _run(self):
+        while True:
+            text = self._queue.get()
+            try:
+                if text is None:
+                    return
+                self._write(text)
+            except Exception as e:
+                logger.error(f"Failed to write memory: {e}")
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,120 @@
+import hashlib
+import sqlite3
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """LRU cache of embeddings bounded by memory, with optional sqlite tier on disk"""
+
+    # sqlite limit on bound parameters per statement
+    _chunk = 500
+
+    def __init__(self, namespace: str, max_bytes: int = 64 * 2**20, path: Optional[Path] = None):
+        """
+        :param str namespace: cache namespace, usually the model path
+        :param int max_bytes: memory budget for cached vectors, defaults to 64 MB
+        :param Optional[Path] path: sqlite file for persistent tier, defaults to None (memory only)
+        """
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._size = 0
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+            self._db.commit()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.split())
+
+    def get_many(self, texts: list[str]) -> dict[str, np.ndarray]:
+        """Get cached vectors
+
+        :param list[str] texts: normalized texts
+        :return dict[str, np.ndarray]: found vectors by text
+        """
+        found: dict[str, np.ndarray] = {}
+        with self._lock:
+            for text in texts:
+                vector = self._memory.get(text)
+                if vector is not None:
+                    self._memory.move_to_end(text)
+                    found[text] = vector
+            self.hits += len(found)
+
+            missing = [text for text in texts if text not in found]
+            if missing and self._db is not None:
+                keys = {self._key(text): text for text in missing}
+                chunks = [list(keys)[i:i + self._chunk] for i in range(0, len(keys), self._chunk)]
+                rows = [
+                    row for chunk in chunks for row in self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                        chunk
+                    ).fetchall()
+                ]
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    found[keys[key]] = vector
+                    self._remember(keys[key], vector)
+                self.disk_hits += len(rows)
+            self.misses += len(texts) - len(found)
+        return found
+
+    def put_many(self, items: dict[str, np.ndarray]):
+        """Cache vectors
+
+        :param dict[str, np.ndarray] items: vectors by normalized text
+        """
+        items = {text: np.asarray(vector, dtype=np.float32).ravel() for text, vector in items.items()}
+        with self._lock:
+            for text, vector in items.items():
+                self._remember(text, vector)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(self._key(text), vector.tobytes()) for text, vector in items.items()]
+                )
+                self._db.commit()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / total if total else 0.0
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "items": len(self._memory),
+            "bytes": self._size,
+        }
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode()).hexdigest()
+
+    def _remember(self, text: str, vector: np.ndarray):
+        if text in self._memory:
+            self._size -= self._memory.pop(text).nbytes
+        self._memory[text] = vector
+        self._size += vector.nbytes
+        while self._size > self.max_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._size -= evicted.nbytes
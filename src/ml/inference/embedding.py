@@ -1,20 +1,77 @@
 from pathlib import Path
+from typing import Optional
 import numpy as np
 from sentence_transformers import SentenceTransformer
+from src.ml.inference.cache import EmbeddingCache
+from src.ml.inference.profile import InferenceProfile
+from src.telemetry.tracer import span
 
 
 class EmbeddingInference:
-    def __init__(self, path: Path):
+    def __init__(
+        self,
+        path: Path,
+        cache: Optional[EmbeddingCache] = None,
+        safetensors: bool = False,
+        profile: Optional[InferenceProfile] = None
+    ):
+        """
+        :param Path path: model path
+        :param Optional[EmbeddingCache] cache: embedding cache, defaults to None
+        :param bool safetensors: load weights from safetensors only, defaults to False
+        :param Optional[InferenceProfile] profile: dtype, quantization and threads, defaults to fp32
+        """
         self._path = path
-        self._model = SentenceTransformer(self._path.as_posix())
+        self._profile = profile or InferenceProfile()
+        self._model = self._profile.apply(SentenceTransformer(
+            self._path.as_posix(),
+            model_kwargs={"use_safetensors": True} if safetensors else None
+        ))
+        self._cache = cache
     
     def extract(self, text: str) -> np.ndarray:
-        return self._model.encode([text]).reshape(1, -1)
+        return self.extract_batch([text]).reshape(1, -1)
+
+    def extract_batch(self, texts: list[str]) -> np.ndarray:
+        """Embed several texts in one encode call, cached texts are not re-encoded
+
+        :param list[str] texts: texts to embed
+        :return np.ndarray: matrix of shape (len(texts), dimension)
+        """
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        if self._cache is None:
+            return self._encode(texts)
+
+        keys = [EmbeddingCache.normalize(text) for text in texts]
+        vectors = self._cache.get_many(list(dict.fromkeys(keys)))
+        missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+        if missing:
+            encoded = dict(zip(missing, self._encode(missing)))
+            self._cache.put_many(encoded)
+            vectors.update(encoded)
+        return np.stack([vectors[key] for key in keys]).astype(np.float32, copy=False)
+
+    def warmup(self):
+        self._encode(["warm up"])
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        with span("embedding.encode", texts=len(texts)), self._profile.context():
+            vectors = self._model.encode(texts, convert_to_tensor=True)
+            return vectors.float().cpu().numpy().reshape(len(texts), -1)
     
     @property
     def dimension(self) -> int:
         return self._model.get_sentence_embedding_dimension() # type: ignore
 
+    @property
+    def cache(self) -> Optional[EmbeddingCache]:
+        return self._cache
+
     @property
     def meta(self):
-        return {'path': self._path}
\ No newline at end of file
+        return {
+            'path': self._path,
+            'cache': self._cache.stats if self._cache else None,
+            'profile': self._profile.model_dump(mode="json")
+        }
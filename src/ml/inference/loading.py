@@ -0,0 +1,58 @@
+from pathlib import Path
+from typing import TypeVar
+
+from accelerate import init_empty_weights
+from huggingface_hub import snapshot_download
+from safetensors import safe_open
+from transformers import AutoConfig, PreTrainedModel
+from transformers.modeling_utils import no_init_weights
+
+from loguru import logger
+
+M = TypeVar("M")
+
+
+def resolve(path: Path | str) -> Path:
+    """Local directory of a model, downloading config and safetensors weights if needed"""
+    if Path(path).is_dir():
+        return Path(path)
+    return Path(snapshot_download(str(path), allow_patterns=["*.json", "*.safetensors"]))
+
+
+def load_mmap(model_cls: type[M], path: Path | str) -> M:
+    """Load model with weights memory-mapped from safetensors files.
+
+    Tensors stay backed by the page cache instead of private copies, so
+    forked workers serving the same model share the weight pages. The
+    model is built on the meta device and keeps the dtype stored in the
+    checkpoint; converting it afterwards copies the weights.
+
+    :param type[M] model_cls: auto model class, e.g. AutoModelForCausalLM
+    :param Path | str path: local directory or hub id
+    :return M: model in eval mode
+    """
+    directory = resolve(path)
+    files = sorted(directory.glob("*.safetensors"))
+    if not files:
+        raise FileNotFoundError(f"No safetensors weights in {directory}")
+
+    config = AutoConfig.from_pretrained(directory)
+    # parameters are not allocated before the mapped tensors are assigned
+    with no_init_weights(), init_empty_weights(include_buffers=False):
+        model: PreTrainedModel = model_cls.from_config(config) # type: ignore
+
+    state = {}
+    for file in files:
+        with safe_open(str(file), framework="pt") as f: # type: ignore
+            for key in f.keys():
+                state[key] = f.get_tensor(key)
+    missing, unexpected = model.load_state_dict(state, strict=False, assign=True)
+    model.tie_weights()
+    if unexpected:
+        logger.warning(f"Unexpected weights in {directory}: {unexpected}")
+    empty = [name for name, param in model.named_parameters() if param.is_meta]
+    if empty:
+        raise ValueError(f"Weights missing in {directory}: {empty}")
+    if missing:
+        logger.debug(f"Weights not in {directory} (tied or buffers): {missing}")
+    return model.eval() # type: ignore
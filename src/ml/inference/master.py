@@ -1,6 +1,27 @@
+import copy
+import threading
+import time
+from collections import OrderedDict, deque
 from pathlib import Path
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from threading import Lock, Thread
+from typing import Callable, Iterable, Iterator, Optional
+import torch
+from transformers import (
+    AutoModelForCausalLM,
+    AutoTokenizer,
+    DynamicCache,
+    StoppingCriteria,
+    StoppingCriteriaList,
+    StopStringCriteria,
+    TextIteratorStreamer,
+)
+from transformers.generation.streamers import BaseStreamer
 from pydantic import BaseModel, Field
+from src.ml.inference.loading import load_mmap
+from src.ml.inference.profile import InferenceProfile
+from src.telemetry.tracer import Span, span, tracer
+
+from loguru import logger
 
 class Message(BaseModel):
     context: str
@@ -16,14 +37,23 @@ class SystemPrompt(BaseModel):
     preambular: str
 
     def make(self, message: Message)-> str:
+        return self.prefix + self.suffix(message)
+
+    @property
+    def prefix(self) -> str:
+        """Static part of the prompt, equal for every message"""
         return f"""
 You are Dungeon Master and you are talking with a player. Respond to the player's actions corresponding to the context.
 Generate a answer of 2-3 sentences to the user's action to continue the story. End this answer with token [END]
 Story Hook: {self.preambular}
-Context: {message.context}
+"""
+
+    def suffix(self, message: Message) -> str:
+        return f"""Context: {message.context}
 User Action: {message.statement}
 Answer:
-""" 
+"""
+
     @property
     def separator(self):
         return "Answer:"
@@ -35,45 +65,583 @@ class GenerationConfig(BaseModel):
     top_p: float = Field(default=1.0)
     repetition_penalty: float = Field(default=1.0)
     max_new_tokens: int = Field(default=2000)
+    max_time: Optional[float] = Field(default=None)
     stop_strings : str = Field(default="[END]")
 
+class DraftConfig(BaseModel):
+    path: Path
+    num_assistant_tokens: int = Field(default=5)
+    min_acceptance: float = Field(default=0.3)
+    min_speedup: float = Field(default=1.0)
+    window: int = Field(default=16)
+    cooldown: int = Field(default=64)
+
+
 class MasterConfig(BaseModel):
     path: Path
     preambular: str
     generation_config: GenerationConfig
+    prefix_cache_size: int = Field(default=8)
+    draft: Optional[DraftConfig] = Field(default=None)
 
     @property
     def prompt(self):
         return SystemPrompt(preambular=self.preambular)
 
+class _TokenTimer(BaseStreamer):
+    """Times the first generated token and counts generated tokens,
+    forwarding everything to an optional wrapped streamer"""
+
+    def __init__(self, streamer: Optional[BaseStreamer] = None):
+        self.streamer = streamer
+        self.start = time.perf_counter()
+        self.first: Optional[float] = None
+        self.tokens = 0
+        self._prompt = True
+
+    def put(self, value):
+        if self._prompt:
+            self._prompt = False
+        else:
+            if self.first is None:
+                self.first = time.perf_counter()
+            self.tokens += value.numel()
+        if self.streamer is not None:
+            self.streamer.put(value)
+
+    def end(self):
+        if self.streamer is not None:
+            self.streamer.end()
+
+    def report(self, s: Span):
+        end = time.perf_counter()
+        first = self.first or end
+        decode = end - first
+        s.set(
+            prefill_s=first - self.start,
+            decode_s=decode,
+            new_tokens=self.tokens,
+            tokens_per_s=(self.tokens - 1) / decode if decode > 0 and self.tokens > 1 else 0.0
+        )
+
+
+class _BatchStreamer(BaseStreamer):
+    """Splits the tokens of each generation step per row and hands newly
+    decoded text of every row to its own callback"""
+
+    def __init__(self, tokenizer, streams: list[Optional[Callable[[str], None]]]):
+        self.tokenizer = tokenizer
+        self.streams = streams
+        self._tokens: list[list[int]] = [[] for _ in streams]
+        self._printed = [0] * len(streams)
+        self._prompt = True
+
+    def put(self, value):
+        if self._prompt:
+            self._prompt = False
+            return
+        ids = value.reshape(len(self.streams), -1).tolist()
+        for row, stream in enumerate(self.streams):
+            if stream is not None:
+                self._tokens[row].extend(ids[row])
+                self._emit(row, final=False)
+
+    def end(self):
+        for row, stream in enumerate(self.streams):
+            if stream is not None:
+                self._emit(row, final=True)
+
+    def _emit(self, row: int, final: bool):
+        text = self.tokenizer.decode(self._tokens[row], skip_special_tokens=True)
+        # a character split between tokens is decoded once it is complete
+        if not final and text.endswith("\ufffd"):
+            return
+        if len(text) > self._printed[row]:
+            self.streams[row](text[self._printed[row]:]) # type: ignore
+        if text.endswith("\n"):
+            self._tokens[row].clear()
+            self._printed[row] = 0
+        else:
+            self._printed[row] = len(text)
+
+
+class _Cancelled(StoppingCriteria):
+    """Stops each sequence once any of its events is set, a single row of events applies to every sequence"""
+
+    def __init__(self, events: list[tuple[Optional[threading.Event], ...]]):
+        self.events = events
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        flags = [any(event is not None and event.is_set() for event in row) for row in self.events]
+        if len(flags) == 1:
+            flags = flags * input_ids.shape[0]
+        return torch.tensor(flags, dtype=torch.bool, device=input_ids.device) # type: ignore
+
+
+class _Speculation:
+    """Acceptance rate and speedup of assisted generation. Falls back to plain
+    generation for `cooldown` requests when the windowed acceptance rate or
+    the measured speedup over plain generation is below the configured minimum"""
+
+    def __init__(self, config: DraftConfig):
+        self.config = config
+        self.acceptance: deque[float] = deque(maxlen=config.window)
+        self.assisted_time: Optional[float] = None
+        self.plain_time: Optional[float] = None
+        self.cooldown = 0
+        self.requests = 0
+        self.fallbacks = 0
+        self._calls = threading.local()
+        self._lock = Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.cooldown == 0
+
+    @property
+    def acceptance_rate(self) -> Optional[float]:
+        return sum(self.acceptance) / len(self.acceptance) if self.acceptance else None
+
+    @property
+    def speedup(self) -> Optional[float]:
+        if self.assisted_time is None or self.plain_time is None:
+            return None
+        return self.plain_time / self.assisted_time
+
+    def hook(self, name: str):
+        """Forward hook counting calls of a model in the generating thread"""
+        def count(module, args, output):
+            setattr(self._calls, name, getattr(self._calls, name, 0) + 1)
+        return count
+
+    def start(self):
+        self._calls.target = 0
+        self._calls.draft = 0
+
+    def record(self, assisted: bool, tokens: int, seconds: float) -> Optional[float]:
+        """Record a finished request
+
+        :param bool assisted: generated with the draft model
+        :param int tokens: new tokens
+        :param float seconds: generation time
+        :return Optional[float]: acceptance rate of the request if assisted
+        """
+        if tokens <= 0:
+            return None
+        target, draft = getattr(self._calls, "target", 0), getattr(self._calls, "draft", 0)
+        with self._lock:
+            per_token = seconds / tokens
+            if not assisted:
+                self.plain_time = _ema(self.plain_time, per_token)
+                self.cooldown = max(self.cooldown - 1, 0)
+                return None
+            # every target call verifies the candidates and adds one token of its own
+            rate = min(max((tokens - target) / draft, 0.0), 1.0) if draft else 0.0
+            self.requests += 1
+            self.acceptance.append(rate)
+            self.assisted_time = _ema(self.assisted_time, per_token)
+            speedup = self.speedup
+            poor = len(self.acceptance) == self.acceptance.maxlen and (
+                self.acceptance_rate < self.config.min_acceptance # type: ignore
+                or (speedup is not None and speedup < self.config.min_speedup)
+            )
+            if poor:
+                logger.warning(
+                    f"Draft model acceptance {self.acceptance_rate:.2f}, speedup {speedup}, "
+                    f"falling back to plain generation for {self.config.cooldown} requests"
+                )
+                self.fallbacks += 1
+                self.cooldown = self.config.cooldown
+                self.acceptance.clear()
+            return rate
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "requests": self.requests,
+            "acceptance_rate": self.acceptance_rate,
+            "speedup": self.speedup,
+            "fallbacks": self.fallbacks,
+        }
+
+
+def _ema(value: Optional[float], sample: float, alpha: float = 0.2) -> float:
+    return sample if value is None else (1 - alpha) * value + alpha * sample
+
+
 class MasterInference:
-    def __init__(self, config: MasterConfig):
+    def __init__(self, config: MasterConfig, mmap: bool = False, profile: Optional[InferenceProfile] = None):
+        """
+        :param MasterConfig config: master config
+        :param bool mmap: memory-map safetensors weights, defaults to False
+        :param Optional[InferenceProfile] profile: dtype, quantization and threads, also used for the draft model, defaults to fp32
+        """
         self._path = config.path
         self._prompt = config.prompt
         self._generation_config = config.generation_config
-        self._tokenizer = AutoTokenizer.from_pretrained(str(self._path))
-        self._model = AutoModelForCausalLM.from_pretrained(str(self._path))
+        self._tokenizer = AutoTokenizer.from_pretrained(str(self._path), padding_side="left")
+        if self._tokenizer.pad_token is None:
+            self._tokenizer.pad_token = self._tokenizer.eos_token
+        self._profile = profile or InferenceProfile()
+        self._model = self._profile.apply(
+            load_mmap(AutoModelForCausalLM, self._path) if mmap
+            else AutoModelForCausalLM.from_pretrained(str(self._path)),
+            mapped=mmap
+        )
+        self._prefix_cache_size = config.prefix_cache_size
+        self._prefix_cache: OrderedDict[str, tuple[torch.Tensor, DynamicCache]] = OrderedDict()
+        self._prefix_lock = Lock()
+        self._stops: dict[str, StoppingCriteria] = {}
+        self._draft = None
+        self._speculation: Optional[_Speculation] = None
+        if config.draft is not None:
+            self._load_draft(config.draft, mmap)
     
+    def _load_draft(self, config: DraftConfig, mmap: bool):
+        """Load draft model for assisted generation. It must share the master vocabulary"""
+        tokenizer = AutoTokenizer.from_pretrained(str(config.path))
+        if tokenizer.get_vocab() != self._tokenizer.get_vocab():
+            logger.warning(f"Draft model {config.path} has a different vocabulary, assisted generation is disabled")
+            return
+        self._draft = self._profile.apply(
+            load_mmap(AutoModelForCausalLM, config.path) if mmap
+            else AutoModelForCausalLM.from_pretrained(str(config.path)),
+            mapped=mmap
+        )
+        self._draft.generation_config.num_assistant_tokens = config.num_assistant_tokens
+        self._speculation = _Speculation(config)
+        self._model.register_forward_hook(self._speculation.hook("target"))
+        self._draft.register_forward_hook(self._speculation.hook("draft"))
+
+    def _assisted(self, batch_size: int = 1) -> bool:
+        """Use the draft model for the next request. Assisted generation runs on single sequences"""
+        return self._speculation is not None and self._speculation.active and batch_size == 1
+
+    def _record(self, s: Span, assisted: bool, tokens: int, seconds: float):
+        if self._speculation is None:
+            return
+        rate = self._speculation.record(assisted, tokens, seconds)
+        s.set(assisted=assisted, **({"acceptance_rate": rate} if rate is not None else {}))
+
+
+    def _response(self, text: str, generation_config: Optional[GenerationConfig] = None) -> str:
+        stop = (generation_config or self._generation_config).stop_strings
+        idx = text.lower().find(stop.lower())
+        return (text if idx == -1 else text[:idx]).strip()
+
+    def _stop(self, stop: str) -> StoppingCriteria:
+        """Stopping criterion for the stop string in different case, built once
+        per stop string. `StopStringCriteria` compiles the variants to token ids
+        and also catches them merged with neighbouring text, e.g. ".[" + "END" + "]"
+
+        :param str stop: stop string
+        :return StoppingCriteria: stopping criterion
+        """
+        if stop not in self._stops:
+            variants = list(dict.fromkeys([stop, stop.lower(), stop.upper(), stop.title()]))
+            self._stops[stop] = StopStringCriteria(self._tokenizer, variants)
+        return self._stops[stop]
+
+    def _generate_kwargs(
+        self,
+        generation_config: Optional[GenerationConfig] = None,
+        assisted: bool = False,
+        cancel: tuple[Optional[threading.Event], ...] = ()
+    ) -> dict:
+        """Generate kwargs, stop string is checked by stopping criteria instead of `stop_strings`.
+        Assisted generation verifies draft tokens with the master, sampling with
+        the same settings, so the output distribution does not change"""
+        config = generation_config or self._generation_config
+        criteria = [self._stop(config.stop_strings)]
+        if any(event is not None for event in cancel):
+            criteria.append(_Cancelled([cancel]))
+        kwargs = dict(
+            **config.model_dump(exclude={"stop_strings"}),
+            stopping_criteria=StoppingCriteriaList(criteria)
+        )
+        if assisted:
+            kwargs["assistant_model"] = self._draft
+        return kwargs
 
-    def _response(self, text: str) -> str:
-        return text.split(self._prompt.separator)[-1].replace("[END]", "").replace('[end]', "").strip()
+    def _prefix(self, text: str) -> tuple[torch.Tensor, DynamicCache]:
+        """Tokenize and prefill static prompt prefix once, reuse it afterwards
 
-    def _generate(self, text: str) -> str:
+        :param str text: prompt prefix
+        :return tuple[torch.Tensor, DynamicCache]: prefix token ids and its past key values
+        """
+        with self._prefix_lock:
+            if text in self._prefix_cache:
+                self._prefix_cache.move_to_end(text)
+                return self._prefix_cache[text]
+
+            ids = self._tokenizer(text, return_tensors="pt").input_ids.to(self._model.device)
+            cache = DynamicCache()
+            with self._profile.context():
+                self._model(input_ids=ids, past_key_values=cache, use_cache=True)
+
+            self._prefix_cache[text] = (ids, cache)
+            if len(self._prefix_cache) > self._prefix_cache_size:
+                self._prefix_cache.popitem(last=False)
+            return ids, cache
+
+    def _inputs(self, prefix: str, suffix: str, cached: bool = True) -> dict:
+        """Model inputs with cached prefix, only suffix is prefilled on generation
+
+        :param str prefix: static prompt prefix
+        :param str suffix: per message prompt suffix
+        :param bool cached: reuse prefix cache, assisted generation prefills the whole prompt, defaults to True
+        :return dict: generate kwargs
+        """
+        if not cached:
+            input_ids = self._tokenizer(prefix + suffix, return_tensors="pt").input_ids.to(self._model.device)
+            return dict(input_ids=input_ids, attention_mask=torch.ones_like(input_ids))
+        with span("prompt") as s:
+            prefix_ids, cache = self._prefix(prefix)
+            suffix_ids = self._tokenizer(
+                suffix,
+                return_tensors="pt",
+                add_special_tokens=False
+            ).input_ids.to(self._model.device)
+            input_ids = torch.cat([prefix_ids, suffix_ids], dim=-1)
+            s.set(prefix_tokens=prefix_ids.shape[-1], suffix_tokens=suffix_ids.shape[-1])
+        return dict(
+            input_ids=input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            past_key_values=copy.deepcopy(cache)
+        )
+
+    def _generate(
+        self,
+        prefix: str,
+        suffix: str,
+        generation_config: Optional[GenerationConfig] = None,
+        cancel: tuple[Optional[threading.Event], ...] = ()
+    ) -> str:
         """Inner function for generate model output
 
-        :param str text: system prompt
-        :param GenerationConfig config: generation config (temperature and etc.)
-        :return str:  system prompt with generated text
+        :param str prefix: static system prompt prefix
+        :param str suffix: system prompt suffix with context and statement
+        :param Optional[GenerationConfig] generation_config: generation config (temperature and etc.), defaults to master config
+        :param tuple[Optional[threading.Event], ...] cancel: stops generation after the current token once any of them is set
+        :return str: generated text without prompt
         """
-        inputs = self._tokenizer(text, return_tensors="pt").to(self._model.device)
-        outputs = self._model.generate(
-            **inputs,
-            **self._generation_config.model_dump(),
-            tokenizer=self._tokenizer
+        assisted = self._assisted()
+        inputs = self._inputs(prefix, suffix, cached=not assisted)
+        with span("generate") as s:
+            timer = _TokenTimer() if tracer.enabled else None
+            if self._speculation is not None:
+                self._speculation.start()
+            start = time.perf_counter()
+            with self._profile.context():
+                outputs = self._model.generate(
+                    **inputs,
+                    **self._generate_kwargs(generation_config, assisted, cancel),
+                    streamer=timer
+                )
+            new_tokens = outputs[0, inputs["input_ids"].shape[-1]:]
+            self._record(s, assisted, new_tokens.numel(), time.perf_counter() - start) # type: ignore
+            if timer is not None:
+                timer.report(s) # type: ignore
+        return self._tokenizer.decode(new_tokens, skip_special_tokens=True)
+
+    def warmup(self):
+        """Prefill default prompt prefix, so the first turn finds it cached"""
+        self._prefix(self._prompt.prefix)
+
+    @property
+    def prompt(self) -> SystemPrompt:
+        return self._prompt
+
+    @property
+    def generation_config(self) -> GenerationConfig:
+        return self._generation_config
+
+    @property
+    def speculation(self) -> Optional[dict]:
+        """Assisted generation stats, None without a draft model"""
+        return self._speculation.stats() if self._speculation is not None else None
+
+    def count_tokens(self, text: str) -> int:
+        return len(self._tokenizer(text, add_special_tokens=False).input_ids)
+
+    def truncate_tokens(self, text: str, max_tokens: int) -> str:
+        """Cut text to its first max_tokens tokens"""
+        ids = self._tokenizer(text, add_special_tokens=False).input_ids
+        return self._tokenizer.decode(ids[:max(max_tokens, 0)], skip_special_tokens=True)
+
+    def generate_batch(
+        self,
+        items: list[tuple[Message, SystemPrompt]],
+        generation_config: Optional[GenerationConfig] = None,
+        cancels: Optional[list[tuple[Optional[threading.Event], ...]]] = None,
+        streams: Optional[list[Optional[Callable[[str], None]]]] = None
+    ) -> list[MasterResponse]:
+        """Generate responses for several prompts in one left-padded batch
+
+        :param list[tuple[Message, SystemPrompt]] items: messages with their session prompts
+        :param Optional[GenerationConfig] generation_config: generation config shared by the batch, defaults to master config
+        :param Optional[list[tuple[Optional[threading.Event], ...]]] cancels: per item events, once any of them is set its sequence stops, defaults to None
+        :param Optional[list[Optional[Callable[[str], None]]]] streams: per item callbacks receiving raw decoded chunks as they are generated, defaults to None
+        :return list[MasterResponse]: responses in input order
+        """
+        if len(items) == 1:
+            message, prompt = items[0]
+            cancel = cancels[0] if cancels else ()
+            stream = streams[0] if streams else None
+            if stream is None:
+                text = self._generate(prompt.prefix, prompt.suffix(message), generation_config, cancel)
+            else:
+                chunks: list[str] = []
+                for chunk in self._stream(prompt.prefix, prompt.suffix(message), cancel, generation_config):
+                    chunks.append(chunk)
+                    stream(chunk)
+                text = "".join(chunks)
+            return [MasterResponse(text=self._response(text, generation_config))]
+        kwargs = self._generate_kwargs(generation_config)
+        if cancels is not None and any(event is not None for row in cancels for event in row):
+            kwargs["stopping_criteria"].append(_Cancelled(list(cancels)))
+        if streams is not None and any(stream is not None for stream in streams):
+            kwargs["streamer"] = _BatchStreamer(self._tokenizer, streams)
+        inputs = self._tokenizer(
+            [prompt.make(message) for message, prompt in items],
+            return_tensors="pt",
+            padding=True
+        ).to(self._model.device)
+        with self._profile.context():
+            outputs = self._model.generate(**inputs, **kwargs)
+        texts = self._tokenizer.batch_decode(
+            outputs[:, inputs.input_ids.shape[-1]:],
+            skip_special_tokens=True
         )
-        return self._tokenizer.decode(outputs[0], skip_special_tokens=True)
+        return [MasterResponse(text=self._response(text, generation_config)) for text in texts]
 
-    def generate(self, message: Message) -> MasterResponse:
-        prompt = self._prompt.make(message)
-        outputs = self._generate(prompt)
-        return MasterResponse(text=self._response(outputs))
+    def _stream(
+        self,
+        prefix: str,
+        suffix: str,
+        cancel: tuple[Optional[threading.Event], ...] = (),
+        generation_config: Optional[GenerationConfig] = None
+    ) -> Iterator[str]:
+        """Inner function for streaming model output
+
+        :param str prefix: static system prompt prefix
+        :param str suffix: system prompt suffix with context and statement
+        :param tuple[Optional[threading.Event], ...] cancel: stops generation after the current token once any of them is set
+        :param Optional[GenerationConfig] generation_config: generation config, defaults to master config
+        :return Iterator[str]: decoded chunks of generated text (without prompt), closing it stops generation
+        """
+        assisted = self._assisted()
+        inputs = self._inputs(prefix, suffix, cached=not assisted)
+        # set when the consumer stops iterating, so the thread is not joined at max_new_tokens
+        stop = threading.Event()
+        kwargs = self._generate_kwargs(generation_config, assisted, (*cancel, stop))
+        streamer = TextIteratorStreamer(
+            self._tokenizer, # type: ignore
+            skip_prompt=True,
+            skip_special_tokens=True
+        )
+        with span("generate", stream=True) as s:
+            timer = _TokenTimer(streamer) if tracer.enabled or self._speculation is not None else None
+            errors: list[BaseException] = []
+            thread = Thread(
+                target=self._generate_in_thread,
+                args=(inputs, kwargs, assisted, timer or streamer, s, errors),
+                daemon=True
+            )
+            thread.start()
+            try:
+                yield from streamer
+            finally:
+                stop.set()
+                thread.join()
+                if timer is not None and tracer.enabled:
+                    timer.report(s) # type: ignore
+            if errors:
+                raise errors[0]
+
+    def _generate_in_thread(
+        self,
+        inputs: dict,
+        kwargs: dict,
+        assisted: bool,
+        streamer: BaseStreamer,
+        s: Span,
+        errors: Optional[list[BaseException]] = None
+    ):
+        """Streaming generate target. Draft model calls are counted per thread,
+        so the result is recorded here. A failure ends the stream, so the
+        consumer is not left waiting, and is handed over in `errors`"""
+        if self._speculation is not None:
+            self._speculation.start()
+        start = time.perf_counter()
+        try:
+            with self._profile.context():
+                self._model.generate(**inputs, **kwargs, streamer=streamer)
+        except BaseException as e:
+            logger.error(f"Streaming generation failed: {e}")
+            if errors is not None:
+                errors.append(e)
+            streamer.end()
+            return
+        if isinstance(streamer, _TokenTimer):
+            self._record(s, assisted, streamer.tokens, time.perf_counter() - start)
+
+    def _until_stop(self, chunks: Iterable[str], generation_config: Optional[GenerationConfig] = None) -> Iterator[str]:
+        """Cut stream on stop string. Text that may be a beginning of the
+        stop string is held back until it is resolved.
+
+        :param Iterable[str] chunks: decoded chunks
+        :param Optional[GenerationConfig] generation_config: config with the stop string, defaults to master config
+        :return Iterator[str]: chunks before stop string
+        """
+        stop = (generation_config or self._generation_config).stop_strings.lower()
+        buffer = ""
+        started = False
+        for chunk in chunks:
+            buffer += chunk
+            if not started:
+                buffer = buffer.lstrip()
+                started = buffer != ""
+            idx = buffer.lower().find(stop)
+            if idx != -1:
+                if buffer[:idx]:
+                    yield buffer[:idx]
+                return
+            hold = next(
+                (n for n in range(len(stop) - 1, 0, -1) if buffer.lower().endswith(stop[:n])),
+                0
+            )
+            if len(buffer) > hold:
+                yield buffer[:len(buffer) - hold]
+                buffer = buffer[len(buffer) - hold:]
+        if buffer:
+            yield buffer
+
+    def generate(
+        self,
+        message: Message,
+        prompt: Optional[SystemPrompt] = None,
+        generation_config: Optional[GenerationConfig] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> MasterResponse:
+        prompt = prompt or self._prompt
+        outputs = self._generate(prompt.prefix, prompt.suffix(message), generation_config, (cancel,))
+        return MasterResponse(text=self._response(outputs, generation_config))
+
+    def generate_stream(
+        self,
+        message: Message,
+        prompt: Optional[SystemPrompt] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> Iterator[str]:
+        """Stream master response as it is generated
+
+        :param Message message: context and user statement
+        :param Optional[SystemPrompt] prompt: session prompt, defaults to config prompt
+        :param Optional[threading.Event] cancel: stops generation after the current token when set, defaults to None
+        :return Iterator[str]: decoded chunks of response
+        """
+        prompt = prompt or self._prompt
+        yield from self._until_stop(
+            self._stream(prompt.prefix, prompt.suffix(message), (cancel,))
+        )
@@ -1,9 +1,14 @@
+import math
 from pathlib import Path
+from typing import Optional
 from transformers import AutoModelForTokenClassification, AutoTokenizer
 from transformers.pipelines.base import Pipeline
 from transformers.pipelines import pipeline
 from pydantic import BaseModel
 from enum import Enum
+from src.ml.inference.loading import load_mmap
+from src.ml.inference.profile import InferenceProfile
+from src.telemetry.tracer import span
 
 
 class NerEntityType(str, Enum):
@@ -24,12 +29,48 @@ class NerEntity(BaseModel):
 
 
 class NerInference:
-    def __init__(self, path: Path):
+    def __init__(self, path: Path, mmap: bool = False, profile: Optional[InferenceProfile] = None):
+        """
+        :param Path path: model path
+        :param bool mmap: memory-map safetensors weights, defaults to False
+        :param Optional[InferenceProfile] profile: dtype, quantization and threads, defaults to fp32
+        """
         self._path = path
+        self._mmap = mmap
+        self._profile = profile or InferenceProfile()
         self._ner = self._load()
     
     def extract(self, text: str) -> list[NerEntity]:
-        output: list[dict] = self._ner(text) # type: ignore
+        with span("ner.extract") as s, self._profile.context():
+            output: list[dict] = self._ner(text) # type: ignore
+            s.set(entities=len(output))
+        return self._entities(output)
+
+    def extract_batch(self, texts: list[str], batch_size: int = 32) -> list[list[NerEntity]]:
+        """Extract entities from several texts in padded batches. Texts are
+        sorted by length before batching, so each batch pads to similar lengths
+
+        :param list[str] texts: texts to process
+        :param int batch_size: texts per forward pass, defaults to 32
+        :return list[list[NerEntity]]: entities for each text, in input order
+        """
+        results: list[list[NerEntity]] = [[] for _ in texts]
+        order = sorted((i for i, text in enumerate(texts) if text.strip()), key=lambda i: len(texts[i]))
+        if not order:
+            return results
+        with span("ner.extract_batch", texts=len(order), batches=math.ceil(len(order) / batch_size)), \
+                self._profile.context():
+            for start in range(0, len(order), batch_size):
+                bucket = order[start:start + batch_size]
+                outputs: list[list[dict]] = self._ner( # type: ignore
+                    [texts[i] for i in bucket],
+                    batch_size=len(bucket)
+                )
+                for i, output in zip(bucket, outputs):
+                    results[i] = self._entities(output)
+        return results
+
+    def _entities(self, output: list[dict]) -> list[NerEntity]:
         return [
             NerEntity(
                 text=e.get('word', ''),
@@ -39,9 +80,17 @@ class NerInference:
 
     def _load(self) -> Pipeline:
         tokenizer = AutoTokenizer.from_pretrained(self._path)
-        model = AutoModelForTokenClassification.from_pretrained(self._path)
+        model = self._profile.apply(
+            load_mmap(AutoModelForTokenClassification, self._path) if self._mmap
+            else AutoModelForTokenClassification.from_pretrained(self._path),
+            mapped=self._mmap
+        )
         return pipeline('ner', model=model, tokenizer=tokenizer, aggregation_strategy="first")
+
+    def warmup(self):
+        with self._profile.context():
+            self._ner("warm up")
     
     @property
     def meta(self):
-        return {'path': self._path}
+        return {'path': self._path, 'profile': self._profile.model_dump(mode="json")}
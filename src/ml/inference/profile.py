@@ -0,0 +1,106 @@
+import threading
+from contextlib import ExitStack, contextmanager
+from enum import Enum
+from typing import Iterator, Optional, TypeVar
+
+import torch
+from pydantic import BaseModel, Field, model_validator
+
+from loguru import logger
+
+M = TypeVar("M", bound=torch.nn.Module)
+
+
+class InferenceDtype(str, Enum):
+    FP32 = "fp32"
+    BF16 = "bf16"
+
+
+class InferenceProfile(BaseModel):
+    """CPU execution settings of a model.
+
+    `quantize` converts linear layers to dynamic int8 and needs fp32 weights.
+    Weights stored in another dtype are converted to `dtype` first; for a
+    memory-mapped model either conversion makes private copies of them.
+    torch keeps one intra-op pool per process, so `threads` is not per model
+    under concurrency: the first of overlapping calls sets the thread count
+    for all of them, and it is restored once the last one is done."""
+
+    dtype: InferenceDtype = Field(default=InferenceDtype.FP32)
+    quantize: bool = Field(default=False)
+    threads: Optional[int] = Field(default=None)
+    inference_mode: bool = Field(default=True)
+
+    @model_validator(mode="after")
+    def _check(self) -> "InferenceProfile":
+        if self.quantize and self.dtype != InferenceDtype.FP32:
+            raise ValueError("dynamic int8 quantization requires fp32 dtype")
+        return self
+
+    @property
+    def precision(self) -> str:
+        """Precision of model outputs: fp32, bf16 or int8"""
+        return "int8" if self.quantize else self.dtype.value
+
+    @property
+    def torch_dtype(self) -> torch.dtype:
+        return torch.bfloat16 if self.dtype == InferenceDtype.BF16 else torch.float32
+
+    def apply(self, model: M, mapped: bool = False) -> M:
+        """Convert model weights to the profile dtype or quantize them
+
+        :param M model: model with weights in any float dtype
+        :param bool mapped: weights are memory-mapped, conversion is reported as it copies them, defaults to False
+        :return M: converted model in eval mode
+        """
+        model.eval()
+        stored = {param.dtype for param in model.parameters() if param.is_floating_point()}
+        if stored - {self.torch_dtype}:
+            if mapped:
+                logger.warning(
+                    f"Memory-mapped weights are stored as {sorted(map(str, stored))}, converting them "
+                    f"to {self.dtype.value} makes private copies; use a matching profile dtype to share them"
+                )
+            model = model.to(self.torch_dtype)
+        if self.quantize:
+            if mapped:
+                logger.warning("Quantizing memory-mapped weights makes private copies of them")
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    @contextmanager
+    def context(self) -> Iterator[None]:
+        """Grad mode and thread count for model calls"""
+        with ExitStack() as stack:
+            stack.enter_context(torch.inference_mode() if self.inference_mode else torch.no_grad())
+            if self.threads is not None:
+                stack.enter_context(_threads.use(self.threads))
+            yield
+
+
+class _ThreadCount:
+    """Process-wide intra-op thread count shared by overlapping model calls"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = 0
+        self._baseline = 0
+
+    @contextmanager
+    def use(self, threads: int) -> Iterator[None]:
+        with self._lock:
+            if self._active == 0:
+                self._baseline = torch.get_num_threads()
+                if threads != self._baseline:
+                    torch.set_num_threads(threads)
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+                if self._active == 0 and torch.get_num_threads() != self._baseline:
+                    torch.set_num_threads(self._baseline)
+
+
+_threads = _ThreadCount()
@@ -0,0 +1,220 @@
+import time
+from collections import defaultdict
+from concurrent.futures import CancelledError, Future
+from dataclasses import dataclass, field
+from queue import Empty, Queue
+from threading import Event, Thread
+from typing import Iterator, Optional
+
+from src.ml.inference.master import GenerationConfig, MasterInference, MasterResponse, Message, SystemPrompt
+
+from pydantic import BaseModel, Field
+from loguru import logger
+
+
+class SchedulerConfig(BaseModel):
+    max_batch_size: int = Field(default=8)
+    max_wait: float = Field(default=0.05)
+    length_bucket: int = Field(default=128)
+
+
+@dataclass
+class GenerationRequest:
+    message: Message
+    prompt: SystemPrompt
+    generation_config: GenerationConfig
+    length: int
+    cancel: Optional[Event] = None
+    chunks: Optional[Queue] = None
+    stop: Event = field(default_factory=Event)
+    future: Future = field(default_factory=Future)
+
+    @property
+    def cancels(self) -> tuple[Optional[Event], ...]:
+        """Caller's cancel and the internal stop of a stream left early"""
+        return (self.cancel, self.stop)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.stop.is_set() or (self.cancel is not None and self.cancel.is_set())
+
+
+class GenerationScheduler:
+    """Collects generation requests from concurrent sessions and runs them
+    in batches bucketed by generation config and prompt length. Streamed
+    requests are batched too, each one gets the chunks of its own row"""
+
+    def __init__(self, master: MasterInference, config: SchedulerConfig):
+        self.master = master
+        self.config = config
+        self.batches = 0
+        self.requests = 0
+        self.generated_tokens = 0
+        self.busy_time = 0.0
+        self._queue: Queue[Optional[GenerationRequest]] = Queue()
+        self._thread = Thread(target=self._run, name="generation-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        message: Message,
+        prompt: Optional[SystemPrompt] = None,
+        generation_config: Optional[GenerationConfig] = None,
+        cancel: Optional[Event] = None
+    ) -> Future:
+        """Schedule generation
+
+        :param Message message: context and user statement
+        :param Optional[SystemPrompt] prompt: session prompt, defaults to master prompt
+        :param Optional[GenerationConfig] generation_config: request generation config, defaults to master config
+        :param Optional[Event] cancel: skips the request if set before its batch starts, stops its sequence after that
+        :return Future: future with MasterResponse
+        """
+        return self._submit(message, prompt, generation_config, cancel).future
+
+    def generate(
+        self,
+        message: Message,
+        prompt: Optional[SystemPrompt] = None,
+        generation_config: Optional[GenerationConfig] = None,
+        cancel: Optional[Event] = None
+    ) -> MasterResponse:
+        try:
+            return self.submit(message, prompt, generation_config, cancel).result()
+        except CancelledError:
+            # cancelled before its batch started
+            return MasterResponse(text="")
+
+    def generate_stream(
+        self,
+        message: Message,
+        prompt: Optional[SystemPrompt] = None,
+        cancel: Optional[Event] = None
+    ) -> Iterator[str]:
+        """Stream master response generated in a batch, leaving the stream early stops its sequence
+
+        :param Message message: context and user statement
+        :param Optional[SystemPrompt] prompt: session prompt, defaults to master prompt
+        :param Optional[Event] cancel: stops generation after the current token when set, defaults to None
+        :return Iterator[str]: decoded chunks of response
+        """
+        request = self._submit(message, prompt, None, cancel, chunks=Queue())
+        try:
+            yield from self.master._until_stop(iter(request.chunks.get, None), request.generation_config) # type: ignore
+        finally:
+            request.stop.set()
+        future = request.future
+        if future.done() and not future.cancelled() and future.exception() is not None:
+            raise future.exception() # type: ignore
+
+    def _submit(
+        self,
+        message: Message,
+        prompt: Optional[SystemPrompt],
+        generation_config: Optional[GenerationConfig],
+        cancel: Optional[Event],
+        chunks: Optional[Queue] = None
+    ) -> GenerationRequest:
+        if not self._thread.is_alive():
+            raise RuntimeError("Generation scheduler is closed")
+        prompt = prompt or self.master.prompt
+        request = GenerationRequest(
+            message=message,
+            prompt=prompt,
+            generation_config=generation_config or self.master.generation_config,
+            length=self.master.count_tokens(prompt.make(message)),
+            cancel=cancel,
+            chunks=chunks
+        )
+        self._queue.put(request)
+        return request
+
+    def close(self):
+        """Finish queued requests and stop the worker"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    @property
+    def throughput(self) -> float:
+        """Generated tokens per second of batch execution"""
+        return self.generated_tokens / self.busy_time if self.busy_time else 0.0
+
+    def _collect(self, first: GenerationRequest) -> tuple[list[GenerationRequest], bool]:
+        requests = [first]
+        deadline = time.monotonic() + self.config.max_wait
+        while len(requests) < self.config.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except Empty:
+                break
+            if request is None:
+                return requests, True
+            requests.append(request)
+        return requests, False
+
+    def _batches(self, requests: list[GenerationRequest]) -> Iterator[list[GenerationRequest]]:
+        groups: defaultdict[str, list[GenerationRequest]] = defaultdict(list)
+        for request in requests:
+            groups[request.generation_config.model_dump_json()].append(request)
+        for group in groups.values():
+            group.sort(key=lambda r: r.length)
+            batch: list[GenerationRequest] = []
+            for request in group:
+                if batch and request.length - batch[0].length > self.config.length_bucket:
+                    yield batch
+                    batch = []
+                batch.append(request)
+            if batch:
+                yield batch
+
+    def _execute(self, batch: list[GenerationRequest]):
+        try:
+            self._generate(batch)
+        finally:
+            # end the streams, the response or error is already in the future
+            for request in batch:
+                if request.chunks is not None:
+                    request.chunks.put(None)
+
+    def _generate(self, batch: list[GenerationRequest]):
+        for request in batch:
+            if request.cancelled:
+                request.future.cancel()
+        batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        start = time.perf_counter()
+        try:
+            responses = self.master.generate_batch(
+                [(request.message, request.prompt) for request in batch],
+                batch[0].generation_config,
+                [request.cancels for request in batch],
+                [request.chunks.put if request.chunks is not None else None for request in batch]
+            )
+        except Exception as e:
+            logger.error(f"Batch generation failed: {e}")
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        self.busy_time += time.perf_counter() - start
+        self.batches += 1
+        self.requests += len(batch)
+        for request, response in zip(batch, responses):
+            self.generated_tokens += self.master.count_tokens(response.text)
+            request.future.set_result(response)
+        logger.debug(f"Generated batch of {len(batch)}, {self.throughput:.1f} tokens/s")
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            requests, closed = self._collect(first)
+            for batch in self._batches(requests):
+                self._execute(batch)
+            if closed:
+                return
@@ -1,6 +1,7 @@
-from IPython.display import display, clear_output, Markdown, HTML
+from IPython.display import display
 import ipywidgets as widgets
 from datetime import datetime
+from html import escape
 from pydantic import BaseModel, PrivateAttr
 from enum import Enum
 import time
@@ -63,14 +64,21 @@ class NotebookSession:
     def __init__(
         self,
         engine: Engine,
+        update_interval: float = 0.05
     ):
+        """
+        :param Engine engine: dialog engine
+        :param float update_interval: minimum seconds between redraws of a streaming message, defaults to 0.05
+        """
         self.engine = engine
         self.history: list[Message] = []
         self.last_master_message: Message | None = None
+        self.update_interval = update_interval
         self._setup()
     
     def _setup(self):
-        self.output = widgets.Output()
+        # one widget per message, a new message is appended without redrawing the others
+        self.messages = widgets.VBox([])
         self.input_line = widgets.Text(
             placeholder='Enter your statement',
             layout=widgets.Layout(width='80%')
@@ -88,7 +96,8 @@ class NotebookSession:
         )
 
         self.window = widgets.VBox([
-            self.output,
+            widgets.HTML(self.styles),
+            self.messages,
             self.input_container
         ])
 
@@ -106,18 +115,25 @@ class NotebookSession:
             text=statement
         ))
         
+        message = Message(actor=ActorType.MASTER)
+        widget = self._append(message, "<div style='color: gray;'>Master thinking...</div>")
         try:
-            self._render()
-            with self.output:
-                display(HTML(
-                    "<div style='color: gray;'>Master thinking...</div>"
-                ))
-            response = self.engine.dialog(statement)
-            self._add_to_history(Message(
-                actor=ActorType.MASTER,
-                text=response.text
-            ))
+            stream = self.engine.dialog_stream(statement)
+            updated = 0.0
+            while True:
+                try:
+                    message.text += next(stream)
+                except StopIteration as stop:
+                    message.text = stop.value.text
+                    break
+                if time.monotonic() - updated >= self.update_interval:
+                    widget.value = self._html(message)
+                    updated = time.monotonic()
+            widget.value = self._html(message)
+            self.history.append(message)
+            self.last_master_message = message
         except Exception as e:
+            self.messages.children = self.messages.children[:-1]
             self._add_to_history(Message(
                 actor=ActorType.SYSTEM,
                 text=f"Error: {e}"
@@ -125,48 +141,50 @@ class NotebookSession:
         
         self.input_line.disabled = False
         self.submit_button.disabled = False
-        self._render()
 
 
     def _add_to_history(self, message: Message):
         if message.actor == ActorType.MASTER:
             self.last_master_message = message
         self.history.append(message)
-    
-    def _render(self):
-        self._clear()
-        with self.output:
-            display(HTML(self.styles))
-        
-        for msg in self.history:
-            timestamp = f"<div class='timestamp'>{msg.timestamp}</div>"
-            match msg.actor:
-                case ActorType.MASTER:
-                    display(HTML(
-                        f"<div class='master-msg'>"
-                        f"{timestamp}"
-                        f"<strong>🧙 Master:</strong> {msg.text}"
-                        f"</div>"
-                    ))
-                case ActorType.PLAYER:
-                    display(HTML(
-                        f"<div class='player-msg'>"
-                        f"{timestamp}"
-                        f"<strong>👤 Player:</strong> {msg.text}"
-                        f"</div>"
-                    ))
-                case ActorType.SYSTEM:
-                    display(HTML(
-                        f"<div class='system-msg'>"
-                        f"{msg.text}"
-                        f"</div>"
-                    ))
-            
-        display(self.input_container)
+        self._append(message)
+
+    def _append(self, message: Message, placeholder: str | None = None) -> widgets.HTML:
+        """Add a widget for message below the previous ones
+
+        :param Message message: message to show
+        :param str | None placeholder: html shown until the message is updated, defaults to None
+        :return widgets.HTML: message widget, its value can be replaced in place
+        """
+        widget = widgets.HTML(placeholder if placeholder is not None else self._html(message))
+        self.messages.children = (*self.messages.children, widget)
+        return widget
+
+    def _html(self, msg: Message) -> str:
+        timestamp = f"<div class='timestamp'>{msg.timestamp}</div>"
+        text = escape(msg.text)
+        match msg.actor:
+            case ActorType.MASTER:
+                return (
+                    f"<div class='master-msg'>"
+                    f"{timestamp}"
+                    f"<strong>🧙 Master:</strong> {text}"
+                    f"</div>"
+                )
+            case ActorType.PLAYER:
+                return (
+                    f"<div class='player-msg'>"
+                    f"{timestamp}"
+                    f"<strong>👤 Player:</strong> {text}"
+                    f"</div>"
+                )
+            case ActorType.SYSTEM:
+                return (
+                    f"<div class='system-msg'>"
+                    f"{text}"
+                    f"</div>"
+                )
 
 
     def run(self):
         display(self.window)
-    
-    def _clear(self):
-        clear_output(wait=True)
\ No newline at end of file
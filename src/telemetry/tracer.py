@@ -0,0 +1,179 @@
+import itertools
+import json
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from pathlib import Path
+from threading import Lock
+from typing import Optional, Protocol
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+
+class SpanRecord(BaseModel):
+    name: str
+    id: int
+    parent: Optional[int] = None
+    start: float
+    duration: float
+    attrs: dict = Field(default_factory=dict)
+
+
+class Exporter(Protocol):
+    def export(self, record: SpanRecord): ...
+
+
+class Span:
+    def __init__(self, tracer: "Tracer", name: str, attrs: dict):
+        self._tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.id = next(tracer._ids)
+        self.parent: Optional[int] = None
+        self.start = 0.0
+        self._started = 0.0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        self.parent = _current.get()
+        self._token = _current.set(self.id)
+        self.start = time.time()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._started
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # span closed from another context, e.g. a generator resumed elsewhere
+            _current.set(self.parent)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self._tracer._export(SpanRecord(
+            name=self.name,
+            id=self.id,
+            parent=self.parent,
+            start=self.start,
+            duration=duration,
+            attrs=self.attrs
+        ))
+
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+_NOOP = _NoopSpan()
+_current: ContextVar[Optional[int]] = ContextVar("span", default=None)
+
+
+class Tracer:
+    """Timing spans exported to pluggable exporters, no-op while disabled"""
+
+    def __init__(self):
+        self.exporters: list[Exporter] = []
+        self._ids = itertools.count(1)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    def span(self, name: str, **attrs) -> Span | _NoopSpan:
+        if not self.exporters:
+            return _NOOP
+        return Span(self, name, attrs)
+
+    def configure(self, exporters: list[Exporter]):
+        """Replace exporters, empty list disables tracing"""
+        self.exporters = list(exporters)
+
+    def close(self):
+        """Disable tracing and close exporters that hold files"""
+        exporters, self.exporters = self.exporters, []
+        for exporter in exporters:
+            close = getattr(exporter, "close", None)
+            if close is not None:
+                close()
+
+    def _export(self, record: SpanRecord):
+        for exporter in self.exporters:
+            exporter.export(record)
+
+
+class HistogramExporter:
+    """Keeps recent span durations in memory and summarizes them per span name"""
+
+    def __init__(self, size: int = 10000):
+        self._durations: defaultdict[str, deque[float]] = defaultdict(lambda: deque(maxlen=size))
+        self._lock = Lock()
+
+    def export(self, record: SpanRecord):
+        with self._lock:
+            self._durations[record.name].append(record.duration)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Duration statistics in seconds by span name"""
+        with self._lock:
+            durations = {name: np.array(values) for name, values in self._durations.items()}
+        return {
+            name: {
+                "count": len(values),
+                "mean": float(values.mean()),
+                "p50": float(np.percentile(values, 50)),
+                "p95": float(np.percentile(values, 95)),
+                "p99": float(np.percentile(values, 99)),
+                "max": float(values.max()),
+            }
+            for name, values in durations.items() if len(values)
+        }
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+
+
+class JsonLinesExporter:
+    """Appends span records to a JSON-lines trace file"""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = Lock()
+
+    def export(self, record: SpanRecord):
+        line = json.dumps(record.model_dump(mode="json"), ensure_ascii=False, default=str)
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        """Flush and close the trace file, later spans are dropped"""
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                self._file.close()
+
+
+tracer = Tracer()
+
+
+def span(name: str, **attrs) -> Span | _NoopSpan:
+    """Timing span of the global tracer
+
+    :param str name: stage name
+    :return Span | _NoopSpan: context manager, `set(**attrs)` adds attributes
+    """
+    return tracer.span(name, **attrs)
@@ -0,0 +1,43 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("faiss")
+pytest.importorskip("transformers")
+
+from src.memory.db.storage import VectorDb
+
+
+class HashEmber:
+    """Deterministic embeddings, enough for storage round trips"""
+
+    dimension = 8
+
+    def extract(self, text: str):
+        return self.extract_batch([text])[0]
+
+    def extract_batch(self, texts: list[str]):
+        return np.stack([
+            np.random.default_rng(abs(hash(text)) % 2**32).random(self.dimension, dtype=np.float32)
+            for text in texts
+        ])
+
+
+def test_partial_last_line_is_dropped_and_rewritten(tmp_path):
+    db = VectorDb(HashEmber(), tmp_path) # type: ignore
+    db.add_many(["first", "second"], [{}, {}])
+    assert db.save()
+
+    # crash while appending a third item: its vector is written, its record is cut
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        HashEmber().extract_batch(["third"]).astype(np.float32).tofile(f)
+    with open(tmp_path / "items.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"text": "thi')
+
+    db = VectorDb(HashEmber(), tmp_path) # type: ignore
+    assert [item.text for item in db] == ["first", "second"]
+    db.add("fourth")
+    assert db.save()
+
+    db = VectorDb(HashEmber(), tmp_path) # type: ignore
+    assert [item.text for item in db] == ["first", "second", "fourth"]
+    assert [item.text for item in db.search("fourth", 1)] == ["fourth"]